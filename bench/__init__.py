@@ -0,0 +1 @@
+"""Host-side benchmarks for the API server, run with ``python -m bench``."""
@@ -0,0 +1,323 @@
+"""Benchmark the API server on the host.
+
+Run from the repository root with ``python -m bench``. The real ``server`` package is run under CPython, with the
+MicroPython-only modules replaced by the stand-ins in ``bench/fakes``. Each endpoint is loaded by concurrent
+keep-alive clients in a separate thread and the following is reported:
+
+* the throughput and the p50/p99 latency,
+* the peak memory allocated by the server while the endpoint is requested sequentially by a client in a separate
+  process, so that the client's own allocations are not counted,
+* the longest and the total time that the event loop was stalled,
+* the number of pin edges caused by the requests.
+
+The scenarios whose name starts with "UDP" send commands of the binary UDP protocol instead of HTTP requests.
+
+The figures depend on the host and are meant to be compared between revisions, not with the device.
+"""
+import argparse
+import asyncio
+import gc
+import multiprocessing
+import os
+import socket
+import struct
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from asyncio import selector_events
+from concurrent.futures import ProcessPoolExecutor
+
+from .client import generate_load, read_response
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def install_shims() -> None:
+    """Make the fakes importable and add the MicroPython extensions of ``time`` and ``gc``.
+
+    The asyncio socket transports read into a new 256 KiB buffer on every receive, which would dominate the traced
+    peak memory, so they are limited to 4 KiB reads.
+    """
+    sys.path[:0] = [os.path.join(ROOT, "bench", "fakes"), ROOT]
+    selector_events._SelectorTransport.max_size = 4096
+    time.ticks_ms = lambda: int(time.perf_counter() * 1000)
+    time.ticks_us = lambda: int(time.perf_counter() * 1000000)
+    time.ticks_diff = lambda new, old: new - old
+    time.ticks_add = lambda ticks, delta: ticks + delta
+    time.sleep_ms = lambda ms: time.sleep(ms / 1000)
+    gc.mem_free = lambda: 0
+    gc.mem_alloc = lambda: tracemalloc.get_traced_memory()[0]
+
+
+def scenarios(devices: int) -> list:
+    """Return the ``(name, requests)`` pairs to benchmark.
+
+    The requests of each scenario are sent in turn, so that state changes alternate between states. The signals and
+    turnouts are created alternately, so signal ``s<n>`` has the device index ``2n`` and turnout ``t<n>`` the index
+    ``2n + 1``.
+    """
+
+    def request(method: str, path: str, body: bytes = b"") -> bytes:
+        head = f"{method} {path} HTTP/1.1\r\nHost: bench\r\n"
+        if body:
+            head = head + f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+        return head.encode() + b"\r\n" + body
+
+    def command(index: int, state: str, states: tuple) -> bytes:
+        # the sequence number is set by the client
+        return struct.pack("!HHB", 0, index, states.index(state))
+
+    last = devices - 1
+    return [
+        ("GET /api/signals", [request("GET", "/api/signals")]),
+        ("GET /api/signals/<sid>", [request("GET", f"/api/signals/s{last}")]),
+        (
+            "PATCH /api/signals/<sid>",
+            [
+                request("PATCH", f"/api/signals/s{idx % devices}", f'{{"state": "{state}"}}'.encode())
+                for idx in range(devices)
+                for state in ("clear", "danger")
+            ],
+        ),
+        (
+            "PATCH /api/signals",
+            [
+                request("PATCH", "/api/signals", f'[{{"id": "s0", "state": "{state}"}}]'.encode())
+                for state in ("clear", "danger")
+            ],
+        ),
+        ("GET /api/turnouts", [request("GET", "/api/turnouts")]),
+        (
+            "PATCH /api/turnouts/<tid>",
+            [
+                request("PATCH", f"/api/turnouts/t{idx % devices}", f'{{"state": "{state}"}}'.encode())
+                for idx in range(devices)
+                for state in ("turn", "straight")
+            ],
+        ),
+        (
+            "UDP signal command",
+            [
+                command(2 * (idx % devices), state, ("off", "danger", "clear"))
+                for idx in range(devices)
+                for state in ("clear", "danger")
+            ],
+        ),
+        (
+            "UDP turnout command",
+            [
+                command(2 * (idx % devices) + 1, state, ("off", "straight", "turn"))
+                for idx in range(devices)
+                for state in ("turn", "straight")
+            ],
+        ),
+        ("GET /api/schema", [request("GET", "/api/schema")]),
+        ("GET /api/system", [request("GET", "/api/system")]),
+        ("GET /api/metrics", [request("GET", "/api/metrics")]),
+    ]
+
+
+async def measure_allocations(
+    pool: ProcessPoolExecutor, port: int, requests: list, duration: float, udp: bool = False
+) -> int:
+    """Return the peak memory in bytes allocated in this process while a client in the pool sends the requests.
+
+    Only the server runs in this process, so the client's allocations are not traced.
+    """
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    await asyncio.get_running_loop().run_in_executor(pool, generate_load, port, requests, 1, duration, udp)
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+    return peak
+
+
+class StallMonitor:
+    """Measure how late the event loop wakes up from a short sleep."""
+
+    def __init__(self: "StallMonitor", interval: float, threshold: float) -> None:
+        """Initialise the monitor with the sleep interval and the lag that counts as a stall, both in seconds."""
+        self.interval = interval
+        self.threshold = threshold
+        self.reset()
+
+    def reset(self: "StallMonitor") -> None:
+        """Clear the recorded stalls."""
+        self.max_lag = 0
+        self.stalled = 0
+
+    async def run(self: "StallMonitor") -> None:
+        """Record the lag of every wake-up.
+
+        The lag is also passed on to the server's metrics, as the watchdog does on the device, so that the stalls are
+        attributed to the handlers in the metrics.
+        """
+        from server.metrics import record_lag
+
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = time.perf_counter() - expected
+            record_lag(int(lag * 1000), int(self.threshold * 1000))
+            if lag > self.max_lag:
+                self.max_lag = lag
+            if lag > self.threshold:
+                self.stalled = self.stalled + lag
+
+
+def percentile(values: list, fraction: float) -> float:
+    """Return the given percentile of the sorted values."""
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def benchmark(args: argparse.Namespace) -> list:
+    """Start the server, create the devices, and benchmark each scenario."""
+    import machine
+    import server  # noqa: F401
+    from server import udp
+    from server.base import server as app
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        udp_port = sock.getsockname()[1]
+    server_task = asyncio.create_task(app.start_server(host="127.0.0.1", port=port))
+    udp_task = asyncio.create_task(udp.serve(udp_port))
+    monitor = StallMonitor(args.stall_interval / 1000, args.stall_threshold / 1000)
+    monitor_task = asyncio.create_task(monitor.run())
+    await asyncio.sleep(0.1)
+
+    setup = []
+    for idx in range(args.devices):
+        setup.append(
+            (
+                "POST",
+                "/api/signals",
+                f'{{"id": "s{idx}", "type": "GermanHauptsignal", "params": {{"red_pin": {2 * idx}, '
+                f'"green_pin": {2 * idx + 1}}}}}',
+            )
+        )
+        setup.append(
+            (
+                "POST",
+                "/api/turnouts",
+                f'{{"id": "t{idx}", "type": "TwoPinSolenoidTurnout", "params": {{"enable_pin": {100 + 2 * idx}, '
+                f'"direction_pin": {101 + 2 * idx}, "turnout_high": true, "self_test": false}}}}',
+            )
+        )
+    for method, path, body in setup:
+        data = (
+            f"{method} {path} HTTP/1.1\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n{body}"
+        ).encode()
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(data)
+        status, _ = await read_response(reader)
+        writer.close()
+        if status != 200:
+            raise RuntimeError(f"Setup request failed with status {status}: {method} {path}")
+
+    # the process is started before any allocations are traced
+    pool = ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn"))
+    await asyncio.get_running_loop().run_in_executor(pool, int)
+    rows = []
+    for name, requests in scenarios(args.devices):
+        if args.only and args.only not in name:
+            continue
+        udp_scenario = name.startswith("UDP")
+        target = udp_port if udp_scenario else port
+        monitor.reset()
+        edges = machine.edges
+        result = await asyncio.to_thread(
+            generate_load, target, requests, args.concurrency, args.duration, udp_scenario
+        )
+        await asyncio.sleep(0.2)
+        max_lag, stalled = monitor.max_lag, monitor.stalled
+        edges = machine.edges - edges
+        peak = await measure_allocations(pool, target, requests, args.duration / 4, udp_scenario)
+        latencies = sorted(result["latencies"])
+        count = len(latencies)
+        errors = count - result["statuses"].get(200, 0)
+        rows.append(
+            (
+                name,
+                count,
+                count / args.duration,
+                percentile(latencies, 0.5) * 1000,
+                percentile(latencies, 0.99) * 1000,
+                errors,
+                peak / 1024,
+                max_lag * 1000,
+                stalled * 1000,
+                edges,
+            )
+        )
+
+    pool.shutdown()
+    monitor_task.cancel()
+    udp.shutdown()
+    await asyncio.gather(udp_task, return_exceptions=True)
+    app.shutdown()
+    await server_task
+    return rows
+
+
+def report(rows: list) -> str:
+    """Format the results as a table."""
+    lines = [
+        f"{'endpoint':<28} {'requests':>8} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>6} "
+        f"{'peak KiB':>8} {'max stall':>9} {'stall ms':>8} {'edges':>6}"
+    ]
+    for row in rows:
+        lines.append(
+            f"{row[0]:<28} {row[1]:>8} {row[2]:>8.1f} {row[3]:>8.2f} {row[4]:>8.2f} {row[5]:>6} {row[6]:>8.1f} "
+            f"{row[7]:>9.2f} {row[8]:>8.2f} {row[9]:>6}"
+        )
+    return "\n".join(lines)
+
+
+def main() -> None:
+    """Parse the command-line arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Benchmark the API server on the host.")
+    parser.add_argument("--duration", type=float, default=3, help="seconds to load each endpoint (default: 3)")
+    parser.add_argument("--concurrency", type=int, default=4, help="number of concurrent clients (default: 4)")
+    parser.add_argument("--devices", type=int, default=8, help="number of signals and turnouts (default: 8)")
+    parser.add_argument("--only", help="only benchmark endpoints that contain this text")
+    parser.add_argument(
+        "--stall-interval", type=float, default=1, help="interval of the loop lag probe in ms (default: 1)"
+    )
+    parser.add_argument(
+        "--stall-threshold", type=float, default=10, help="loop lag that counts as a stall in ms (default: 10)"
+    )
+    parser.add_argument("--output", help="also write the results to this file")
+    args = parser.parse_args()
+
+    install_shims()
+    sys.setswitchinterval(0.001)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        # the settings and the registry are read from and written to the working directory
+        os.chdir(workdir)
+        with open(".env", "w"):
+            pass
+        try:
+            rows = asyncio.run(benchmark(args))
+        finally:
+            os.chdir(cwd)
+    table = report(rows)
+    print(table)
+    if args.output:
+        with open(args.output, "w") as out_f:
+            out_f.write(table + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""The load generating clients of the benchmark.
+
+The clients are kept out of ``bench.__main__``, so that they can be run in a separate process.
+"""
+import asyncio
+import socket
+import struct
+import time
+
+
+async def read_response(reader: asyncio.StreamReader) -> tuple:
+    """Read a response and return its status code and whether the server closes the connection."""
+    head = await reader.readuntil(b"\r\n\r\n")
+    lower = head.lower()
+    length = 0
+    idx = lower.find(b"\r\ncontent-length:")
+    if idx >= 0:
+        length = int(lower[idx + 17:lower.find(b"\r\n", idx + 2)])
+    await reader.readexactly(length)
+    return int(head[9:12]), b"\r\nconnection: close" in lower
+
+
+async def client(port: int, requests: list, deadline: float, result: dict) -> None:
+    """Send the requests in turn over a keep-alive connection until the deadline."""
+    reader = writer = None
+    idx = 0
+    while time.perf_counter() < deadline:
+        if writer is None:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        start = time.perf_counter()
+        writer.write(requests[idx % len(requests)])
+        idx = idx + 1
+        try:
+            await writer.drain()
+            status, close = await asyncio.wait_for(read_response(reader), 10)
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            status, close = 0, True
+        result["latencies"].append(time.perf_counter() - start)
+        result["statuses"][status] = result["statuses"].get(status, 0) + 1
+        if close:
+            writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def udp_client(port: int, frames: list, deadline: float, result: dict) -> None:
+    """Send the UDP command frames in turn until the deadline, each with the next sequence number.
+
+    An acknowledgement with the OK status is counted as status 200, and other statuses as themselves.
+    """
+    loop = asyncio.get_running_loop()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setblocking(False)
+    sock.connect(("127.0.0.1", port))
+    seq = 0
+    while time.perf_counter() < deadline:
+        frame = struct.pack("!H", seq) + frames[seq % len(frames)][2:]
+        seq = (seq + 1) & 0xFFFF
+        start = time.perf_counter()
+        try:
+            await loop.sock_sendall(sock, frame)
+            ack = await asyncio.wait_for(loop.sock_recv(sock, 16), 10)
+            status = 200 if ack[4] == 0 else ack[4]
+        except (OSError, asyncio.TimeoutError):
+            status = 0
+        result["latencies"].append(time.perf_counter() - start)
+        result["statuses"][status] = result["statuses"].get(status, 0) + 1
+    sock.close()
+
+
+def generate_load(port: int, requests: list, concurrency: int, duration: float, udp: bool = False) -> dict:
+    """Run the clients in their own event loop and return the latencies and status counts.
+
+    If `udp` is set, the requests are UDP command frames sent to the UDP port.
+    """
+    result = {"latencies": [], "statuses": {}}
+    run_client = udp_client if udp else client
+
+    async def run() -> None:
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*[run_client(port, requests, deadline, result) for _ in range(concurrency)])
+
+    asyncio.run(run())
+    return result
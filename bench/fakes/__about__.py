@@ -0,0 +1,2 @@
+"""Version information, which is generated when deploying to the device."""
+__version__ = "0.0.0-bench"
@@ -0,0 +1,80 @@
+"""Stand-in for the MicroPython ``machine`` module.
+
+Every change of a pin's value is counted in :data:`edges` and recorded with its ``time.ticks_us()`` timestamp, so
+that the benchmark can count the hardware activity caused by each request and pulse widths and the order of edges can
+be checked with :func:`recorded`. The changes are kept in a preallocated ring buffer of the last :data:`capacity`
+changes, so that recording them does not allocate memory in the benchmarked process.
+"""
+import time
+from array import array
+
+#: The number of pin changes kept in the ring buffer
+capacity = 4096
+#: The number of pin changes
+edges = 0
+
+_pins = [None] * capacity
+_values = bytearray(capacity)
+_times = array("q", [0]) * capacity
+
+
+def recorded(since: int = 0) -> list:
+    """Return the pin changes after the first `since` ones as ``(pin id, value, ticks_us)`` tuples, oldest first.
+
+    Changes that have been overwritten in the ring buffer are left out.
+    """
+    result = []
+    for index in range(max(since, edges - capacity), edges):
+        slot = index % capacity
+        result.append((_pins[slot], _values[slot], _times[slot]))
+    return result
+
+
+class Pin:
+    """A pin that records every change of its value."""
+
+    IN = 0
+    OUT = 1
+
+    def __init__(self: "Pin", id, mode: int = -1, value: int | None = None) -> None:  # noqa: ANN001
+        """Initialise the pin as low."""
+        self.id = id
+        self._value = 0
+        if value is not None:
+            self.value(value)
+
+    def on(self: "Pin") -> None:
+        """Set the pin high."""
+        self.value(1)
+
+    def off(self: "Pin") -> None:
+        """Set the pin low."""
+        self.value(0)
+
+    def toggle(self: "Pin") -> None:
+        """Invert the pin."""
+        self.value(1 - self._value)
+
+    def value(self: "Pin", value=None):  # noqa: ANN001, ANN201
+        """Return the pin value or, if a value is given, set the pin."""
+        global edges
+        if value is None:
+            return self._value
+        value = 1 if value else 0
+        if value != self._value:
+            self._value = value
+            slot = edges % capacity
+            _pins[slot] = self.id
+            _values[slot] = value
+            _times[slot] = time.ticks_us()
+            edges = edges + 1
+
+
+def reset() -> None:
+    """Stop the benchmark, as the device would restart."""
+    raise SystemExit("machine.reset() called")
+
+
+def soft_reset() -> None:
+    """Stop the benchmark, as the device would restart."""
+    raise SystemExit("machine.soft_reset() called")
@@ -0,0 +1,50 @@
+"""Stand-in for the MicroPython ``network`` module, which is always connected."""
+
+
+STA_IF = 0
+AP_IF = 1
+STAT_IDLE = 0
+STAT_CONNECTING = 1
+STAT_WRONG_PASSWORD = -3
+STAT_NO_AP_FOUND = -2
+STAT_CONNECT_FAIL = -1
+STAT_GOT_IP = 3
+
+
+class WLAN:
+    """A wireless interface that connects immediately."""
+
+    def __init__(self: "WLAN", interface: int = STA_IF) -> None:
+        """Initialise the inactive interface."""
+        self._active = False
+        self._connected = False
+
+    def active(self: "WLAN", active: bool | None = None) -> bool:
+        """Return or set whether the interface is active."""
+        if active is not None:
+            self._active = active
+        return self._active
+
+    def connect(self: "WLAN", ssid: str | None = None, key: str | None = None) -> None:
+        """Connect to the network."""
+        self._connected = True
+
+    def disconnect(self: "WLAN") -> None:
+        """Disconnect from the network."""
+        self._connected = False
+
+    def isconnected(self: "WLAN") -> bool:
+        """Return whether the interface is connected."""
+        return self._connected
+
+    def status(self: "WLAN") -> int:
+        """Return the connection status."""
+        return STAT_GOT_IP if self._connected else STAT_IDLE
+
+    def config(self: "WLAN", **kwargs) -> None:  # noqa: ANN003
+        """Ignore any configuration."""
+        pass
+
+    def ifconfig(self: "WLAN") -> tuple:
+        """Return the loopback configuration."""
+        return ("127.0.0.1", "255.0.0.0", "127.0.0.1", "127.0.0.1")
@@ -0,0 +1,8 @@
+"""Stand-in for MicroPython's ``uasyncio``, based on ``asyncio``."""
+from asyncio import *  # noqa: F401, F403
+from asyncio import sleep
+
+
+async def sleep_ms(ms: int) -> None:
+    """Sleep for the given number of milliseconds."""
+    await sleep(ms / 1000)
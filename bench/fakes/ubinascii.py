@@ -0,0 +1,2 @@
+"""Stand-in for MicroPython's ``ubinascii``."""
+from binascii import *  # noqa: F401, F403
@@ -1,7 +1,14 @@
 """The main application."""
+from utoolkit.files import apply_journal
+from utoolkit.mpy import check_installed, installed
 
-from server import start_server, shutdown_server
-from utoolkit.wifi import connect
+# Complete a bundle deployment that was interrupted and fall back to the source of any .mpy modules that the firmware
+# cannot load, before any of the updated modules are imported
+apply_journal('bundle.journal', installed)
+check_installed()
+
+from server import start_server, shutdown_server  # noqa: E402
+from utoolkit.wifi import connect  # noqa: E402
 
 
 if connect(attempts=3):
@@ -340,6 +340,9 @@ class Request():
         self.content_length = 0
         #: The parsed ``Content-Type`` header.
         self.content_type = None
+        #: The URL pattern of the route that handles the request, or ``None``
+        #: if no route matches.
+        self.url_rule = None
         #: A general purpose container for applications to store data during
         #: the life of the request.
         self.g = Request.G()
@@ -597,6 +600,8 @@ class Response():
         if isinstance(self.body, bytes) and \
                 'Content-Length' not in self.headers:
             self.headers['Content-Length'] = str(len(self.body))
+        elif self.body is None and 'Content-Length' not in self.headers:
+            self.headers['Content-Length'] = '0'
         if 'Content-Type' not in self.headers:
             self.headers['Content-Type'] = self.default_content_type
             if 'charset=' not in self.headers['Content-Type']:
@@ -719,6 +724,33 @@ class Response():
         return cls(body=f, status_code=status_code, headers=headers)
 
 
+def parse_url_segment(segment):
+    """Parse a dynamic URL pattern segment such as ``<int:id>``.
+
+    Returns a tuple with the segment type, the argument name and the regular
+    expression that matches the segment.
+    """
+    if segment[-1] != '>':
+        raise ValueError('invalid URL pattern')
+    segment = segment[1:-1]
+    if ':' in segment:
+        type_, name = segment.rsplit(':', 1)
+    else:
+        type_ = 'string'
+        name = segment
+    if type_ == 'string':
+        pattern = '[^/]+'
+    elif type_ == 'int':
+        pattern = '-?\\d+'
+    elif type_ == 'path':
+        pattern = '.+'
+    elif type_.startswith('re:'):
+        pattern = type_[3:]
+    else:
+        raise ValueError('invalid URL segment type')
+    return type_, name, pattern
+
+
 class URLPattern():
     def __init__(self, url_pattern):
         self.url_pattern = url_pattern
@@ -727,24 +759,7 @@ class URLPattern():
         use_regex = False
         for segment in url_pattern.lstrip('/').split('/'):
             if segment and segment[0] == '<':
-                if segment[-1] != '>':
-                    raise ValueError('invalid URL pattern')
-                segment = segment[1:-1]
-                if ':' in segment:
-                    type_, name = segment.rsplit(':', 1)
-                else:
-                    type_ = 'string'
-                    name = segment
-                if type_ == 'string':
-                    pattern = '[^/]+'
-                elif type_ == 'int':
-                    pattern = '-?\\d+'
-                elif type_ == 'path':
-                    pattern = '.+'
-                elif type_.startswith('re:'):
-                    pattern = type_[3:]
-                else:
-                    raise ValueError('invalid URL segment type')
+                type_, name, pattern = parse_url_segment(segment)
                 use_regex = True
                 self.pattern += '/({pattern})'.format(pattern=pattern)
                 self.args.append({'type': type_, 'name': name})
@@ -772,6 +787,95 @@ class URLPattern():
         return args
 
 
+class URLTree():
+    """A tree of URL path segments used to find the routes for a path.
+
+    Static segments are resolved with a dictionary lookup. Dynamic segments
+    are only tried if no route below the static segment matches, and regular
+    expressions are only used for ``re:`` segments, which must match a single
+    path segment.
+    """
+    def __init__(self):
+        self.static = {}
+        self.dynamic = []
+        self.routes = []
+
+    def add(self, url_pattern, methods, handler):
+        """Add a route for the given URL pattern to the tree."""
+        node = self
+        for segment in url_pattern.lstrip('/').split('/'):
+            if segment and segment[0] == '<':
+                for text, arg, child in node.dynamic:
+                    if text == segment:
+                        node = child
+                        break
+                else:
+                    type_, name, pattern = parse_url_segment(segment)
+                    arg = {'type': type_, 'name': name}
+                    if type_.startswith('re:'):
+                        arg['pattern'] = re.compile('^' + pattern + '$')
+                    child = URLTree()
+                    node.dynamic.append((segment, arg, child))
+                    node = child
+            else:
+                if segment not in node.static:
+                    node.static[segment] = URLTree()
+                node = node.static[segment]
+        node.routes.append((methods, handler, url_pattern))
+
+    def items(self):
+        """Generate the ``(url_pattern, methods, handler)`` tuples of all the
+        routes in the tree, in an order that adds them to another tree with
+        the same priorities."""
+        for methods, handler, url_pattern in self.routes:
+            yield url_pattern, methods, handler
+        for child in self.static.values():
+            yield from child.items()
+        for text, arg, child in self.dynamic:
+            yield from child.items()
+
+    def match(self, path):
+        """Generate the ``(methods, handler, url_args, url_pattern)`` tuples
+        of all routes that match the path, in order of priority."""
+        return self._match(path.lstrip('/').split('/'), 0, {})
+
+    def _match(self, segments, i, args):
+        if i == len(segments):
+            for methods, handler, url_pattern in self.routes:
+                yield methods, handler, args, url_pattern
+            return
+        segment = segments[i]
+        child = self.static.get(segment)
+        if child is not None:
+            yield from child._match(segments, i + 1, args)
+        for text, arg, child in self.dynamic:
+            type_ = arg['type']
+            if type_ == 'path':
+                for j in range(len(segments), i, -1):
+                    value = '/'.join(segments[i:j])
+                    if value:
+                        child_args = args.copy()
+                        child_args[arg['name']] = value
+                        yield from child._match(segments, j, child_args)
+                continue
+            if not segment:
+                continue
+            if type_ == 'int':
+                digits = segment[1:] if segment[0] == '-' else segment
+                if not digits or not digits.isdigit():
+                    continue
+                value = int(segment)
+            elif type_ == 'string':
+                value = segment
+            elif arg['pattern'].match(segment):
+                value = segment
+            else:
+                continue
+            child_args = args.copy()
+            child_args[arg['name']] = value
+            yield from child._match(segments, i + 1, child_args)
+
+
 class HTTPException(Exception):
     def __init__(self, status_code, reason=None):
         self.status_code = status_code
@@ -796,7 +900,7 @@ class Microdot():
     """
 
     def __init__(self):
-        self.url_map = []
+        self.url_tree = URLTree()
         self.before_request_handlers = []
         self.after_request_handlers = []
         self.after_error_request_handlers = []
@@ -837,9 +941,8 @@ class Microdot():
                 return 'Hello, world!'
         """
         def decorated(f):
-            self.url_map.append(
-                ([m.upper() for m in (methods or ['GET'])],
-                 URLPattern(url_pattern), f))
+            route_methods = [m.upper() for m in (methods or ['GET'])]
+            self.url_tree.add(url_pattern, route_methods, f)
             return f
         return decorated
 
@@ -1013,10 +1116,8 @@ class Microdot():
         :param subapp: The sub-application to mount.
         :param url_prefix: The URL prefix to mount the application under.
         """
-        for methods, pattern, handler in subapp.url_map:
-            self.url_map.append(
-                (methods, URLPattern(url_prefix + pattern.url_pattern),
-                 handler))
+        for url_pattern, methods, handler in subapp.url_tree.items():
+            self.url_tree.add(url_prefix + url_pattern, methods, handler)
         for handler in subapp.before_request_handlers:
             self.before_request_handlers.append(handler)
         for handler in subapp.after_request_handlers:
@@ -1131,21 +1232,20 @@ class Microdot():
         if method == 'HEAD':
             method = 'GET'
         f = 404
-        for route_methods, route_pattern, route_handler in self.url_map:
-            req.url_args = route_pattern.match(req.path)
-            if req.url_args is not None:
-                if method in route_methods:
-                    f = route_handler
-                    break
-                else:
-                    f = 405
+        for route_methods, route_handler, url_args, url_pattern in \
+                self.url_tree.match(req.path):
+            if method in route_methods:
+                req.url_args = url_args
+                req.url_rule = url_pattern
+                return route_handler
+            f = 405
         return f
 
     def default_options_handler(self, req):
         allow = []
-        for route_methods, route_pattern, route_handler in self.url_map:
-            if route_pattern.match(req.path) is not None:
-                allow.extend(route_methods)
+        for route_methods, route_handler, url_args, url_pattern in \
+                self.url_tree.match(req.path):
+            allow.extend(route_methods)
         if 'GET' in allow:
             allow.append('HEAD')
         allow.append('OPTIONS')
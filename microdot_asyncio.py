@@ -43,6 +43,9 @@ class _AsyncBytesIO:
     async def readexactly(self, n):  # pragma: no cover
         return self.stream.read(n)
 
+    async def readinto(self, buf):  # pragma: no cover
+        return self.stream.readinto(buf)
+
     async def readuntil(self, separator=b'\n'):  # pragma: no cover
         return self.stream.readuntil(separator=separator)
 
@@ -53,9 +56,212 @@ class _AsyncBytesIO:
         pass
 
 
+class _StreamBuffer:
+    """A buffered reader for a client connection.
+
+    Data is read into a preallocated ``bytearray`` that is reused for all the
+    requests received over the connection. Bytes that are read past the end
+    of the request headers are returned by the subsequent reads.
+
+    :param stream: The input stream of the client connection.
+    :param size: The size of the buffer, which limits the length of the
+                 request line and headers.
+
+    The ``timeout`` attribute can be set to limit the number of seconds that
+    each read of the request body waits for data.
+    """
+    def __init__(self, stream, size):
+        self.stream = stream
+        self.buf = bytearray(size)
+        self.mv = memoryview(self.buf)
+        self.start = 0
+        self.end = 0
+        self.timeout = None
+
+    async def _wait(self, coro):
+        if self.timeout:
+            return await asyncio.wait_for(coro, self.timeout)
+        return await coro
+
+    async def _fill(self):
+        if self.start == self.end:
+            self.start = self.end = 0
+        elif self.start > 0:
+            length = self.end - self.start
+            self.mv[:length] = self.mv[self.start:self.end]
+            self.start = 0
+            self.end = length
+        if self.end == len(self.buf):
+            raise ValueError('request too large')
+        if hasattr(self.stream, 'readinto'):
+            n = await self.stream.readinto(self.mv[self.end:])
+        else:  # pragma: no cover
+            data = await self.stream.read(len(self.buf) - self.end)
+            n = len(data)
+            self.mv[self.end:self.end + n] = data
+        if n:
+            self.end += n
+        return n
+
+    async def read_header_block(self):
+        """Read the request line and headers.
+
+        Returns the bytes up to and including the line break that ends the
+        last header line, or ``None`` if the connection has been closed.
+        """
+        searched = 0
+        while True:
+            if self.end > self.start:
+                data = bytes(self.mv[self.start:self.end])
+                i = data.find(b'\r\n\r\n', searched)
+                if i >= 0:
+                    self.start += i + 4
+                    return data[:i + 2]
+                i = data.find(b'\n\n', searched)
+                if i >= 0:
+                    self.start += i + 2
+                    return data[:i + 1]
+                searched = max(len(data) - 3, 0)
+            if not await self._fill():
+                return None
+
+    async def read(self, n=-1):
+        if self.end > self.start:
+            if n < 0 or n > self.end - self.start:
+                n = self.end - self.start
+            data = bytes(self.mv[self.start:self.start + n])
+            self.start += n
+            return data
+        return await self._wait(self.stream.read(n))
+
+    async def readinto(self, buf):
+        if self.end > self.start:
+            n = min(len(buf), self.end - self.start)
+            buf[:n] = self.mv[self.start:self.start + n]
+            self.start += n
+            return n
+        if hasattr(self.stream, 'readinto'):
+            return await self._wait(self.stream.readinto(buf))
+        data = await self._wait(  # pragma: no cover
+            self.stream.read(len(buf)))
+        buf[:len(data)] = data  # pragma: no cover
+        return len(data)  # pragma: no cover
+
+    async def readexactly(self, n):
+        data = await self.read(n)
+        if len(data) < n:
+            data += await self._wait(
+                self.stream.readexactly(n - len(data)))
+        return data
+
+    async def readline(self):
+        if self.end > self.start:
+            data = bytes(self.mv[self.start:self.end])
+            i = data.find(b'\n')
+            if i >= 0:
+                self.start += i + 1
+                return data[:i + 1]
+            self.start = self.end
+            return data + await self._wait(self.stream.readline())
+        return await self._wait(self.stream.readline())
+
+
+class HeaderBlock:
+    """The headers of a request, parsed on demand.
+
+    :param data: The request line and headers, as bytes.
+
+    Only the headers that are accessed are decoded. The methods that need all
+    headers, as well as any modification, convert the headers to a
+    :class:`NoCaseDict <microdot.NoCaseDict>` first.
+    """
+    def __init__(self, data):
+        self._data = data
+        self._lower = None
+        self._cache = {}
+        self._dict = None
+
+    def _lookup(self, key):
+        kl = key.lower()
+        if kl in self._cache:
+            return self._cache[kl]
+        if self._lower is None:
+            self._lower = self._data.lower()
+        name = b'\n' + kl.encode() + b':'
+        i = self._lower.find(name)
+        value = None
+        if i >= 0:
+            i += len(name)
+            value = self._data[i:self._data.find(b'\n', i)].strip().decode()
+        self._cache[kl] = value
+        return value
+
+    def _headers(self):
+        if self._dict is None:
+            self._dict = NoCaseDict()
+            for line in self._data.split(b'\n')[1:]:
+                if b':' in line:
+                    header, value = line.decode().split(':', 1)
+                    self._dict[header] = value.strip()
+            self._data = self._lower = self._cache = None
+        return self._dict
+
+    def __getitem__(self, key):
+        if self._dict is not None:
+            return self._dict[key]
+        value = self._lookup(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        if self._dict is not None:
+            return key in self._dict
+        return self._lookup(key) is not None
+
+    def get(self, key, default=None):
+        if self._dict is not None:
+            return self._dict.get(key, default)
+        value = self._lookup(key)
+        return default if value is None else value
+
+    def __setitem__(self, key, value):
+        self._headers()[key] = value
+
+    def __delitem__(self, key):
+        del self._headers()[key]
+
+    def __iter__(self):
+        return iter(self._headers())
+
+    def __len__(self):
+        return len(self._headers())
+
+    def keys(self):
+        return self._headers().keys()
+
+    def values(self):
+        return self._headers().values()
+
+    def items(self):
+        return self._headers().items()
+
+    def update(self, other_dict):
+        self._headers().update(other_dict)
+
+    def __repr__(self):  # pragma: no cover
+        return repr(self._headers())
+
+
 class Request(BaseRequest):
+    #: Specify the maximum length of the request line and headers together.
+    #: The buffer that they are read into is allocated once per connection.
+    #: Requests with longer headers are rejected with a 400 status code.
+    max_header_length = 2 * 1024
+
     @staticmethod
-    async def create(app, client_reader, client_writer, client_addr):
+    async def create(app, client_reader, client_writer, client_addr,
+                     buffer=None):
         """Create a request object.
 
         :param app: The Microdot application instance.
@@ -64,39 +270,38 @@ class Request(BaseRequest):
         :param client_writer: An output stream where the response data can be
                               written.
         :param client_addr: The address of the client, as a tuple.
+        :param buffer: The buffered reader for the connection, which is reused
+                       for subsequent requests on the same connection. If not
+                       given, a new one is created for ``client_reader``.
 
         This method is a coroutine. It returns a newly created ``Request``
         object.
         """
+        if buffer is None:
+            buffer = _StreamBuffer(client_reader, Request.max_header_length)
+
         # request line
-        line = (await Request._safe_readline(client_reader)).strip().decode()
-        if not line:
+        data = await buffer.read_header_block()
+        if not data:
             return None
-        method, url, http_version = line.split()
+        i = data.find(b'\n')
+        method, url, http_version = data[:i].decode().split()
         http_version = http_version.split('/', 1)[1]
 
         # headers
-        headers = NoCaseDict()
-        content_length = 0
-        while True:
-            line = (await Request._safe_readline(
-                client_reader)).strip().decode()
-            if line == '':
-                break
-            header, value = line.split(':', 1)
-            value = value.strip()
-            headers[header] = value
-            if header.lower() == 'content-length':
-                content_length = int(value)
+        headers = HeaderBlock(data)
+        content_length = int(headers.get('Content-Length', 0))
 
         # body
         body = b''
-        if content_length and content_length <= Request.max_body_length:
-            body = await client_reader.readexactly(content_length)
+        if content_length <= Request.max_body_length:
+            # requests without a body do not read from the connection either
+            if content_length:
+                body = await buffer.readexactly(content_length)
             stream = None
         else:
             body = b''
-            stream = client_reader
+            stream = buffer
 
         return Request(app, client_addr, method, url, http_version, headers,
                        body=body, stream=stream,
@@ -108,13 +313,6 @@ class Request(BaseRequest):
             self._stream = _AsyncBytesIO(self._body)
         return self._stream
 
-    @staticmethod
-    async def _safe_readline(stream):
-        line = (await stream.readline())
-        if len(line) > Request.max_readline:
-            raise ValueError('line too long')
-        return line
-
 
 class Response(BaseResponse):
     """An HTTP response class.
@@ -132,6 +330,11 @@ class Response(BaseResponse):
                    "N/A" for any other status codes.
     """
 
+    #: Bodies of up to this many bytes are sent in a single write together
+    #: with the status line and headers. Larger and streamed bodies are
+    #: written separately after the headers.
+    max_single_write_body = 1024
+
     async def write(self, stream):
         self.complete()
 
@@ -139,19 +342,28 @@ class Response(BaseResponse):
             # status code
             reason = self.reason if self.reason is not None else \
                 ('OK' if self.status_code == 200 else 'N/A')
-            await stream.awrite('HTTP/1.0 {status_code} {reason}\r\n'.format(
-                status_code=self.status_code, reason=reason).encode())
+            parts = ['HTTP/1.1 {status_code} {reason}\r\n'.format(
+                status_code=self.status_code, reason=reason).encode()]
 
             # headers
             for header, value in self.headers.items():
                 values = value if isinstance(value, list) else [value]
                 for value in values:
-                    await stream.awrite('{header}: {value}\r\n'.format(
+                    parts.append('{header}: {value}\r\n'.format(
                         header=header, value=value).encode())
-            await stream.awrite(b'\r\n')
+            parts.append(b'\r\n')
+
+            # small bodies are joined with the headers into one buffer
+            single_write = self.is_head or (
+                isinstance(self.body, bytes) and
+                len(self.body) <= self.max_single_write_body)
+            if single_write and not self.is_head:
+                parts.append(self.body)
+            await stream.awrite(b''.join(parts))
+            parts = None
 
             # body
-            if not self.is_head:
+            if not single_write:
                 async for body in self.body_iter():
                     if isinstance(body, str):  # pragma: no cover
                         body = body.encode()
@@ -162,6 +374,9 @@ class Response(BaseResponse):
                 pass
             else:
                 raise
+        finally:
+            if hasattr(self.body, 'aclose'):
+                await self.body.aclose()
 
     def body_iter(self):
         if hasattr(self.body, '__anext__'):
@@ -210,6 +425,53 @@ class Response(BaseResponse):
 
 
 class Microdot(BaseMicrodot):
+    #: The number of seconds that a persistent connection is kept open while
+    #: waiting for the next request.
+    keep_alive_timeout = 5
+
+    #: The maximum number of requests that are served over a single
+    #: persistent connection before it is closed.
+    max_keep_alive_requests = 100
+
+    #: The maximum number of persistent connections that are kept open while
+    #: waiting for the next request. Further connections are closed after
+    #: their response has been sent.
+    max_idle_connections = 4
+
+    #: Whether the next request on a persistent connection is parsed while
+    #: the current one is handled. Handlers still run one at a time and the
+    #: responses are sent in the order of the requests.
+    pipeline_requests = True
+
+    #: The maximum number of requests that are handled concurrently. Idle
+    #: persistent connections and responses that stream from an async
+    #: iterator do not count towards this limit.
+    max_concurrent_requests = 4
+
+    #: The maximum number of new connections that wait for one of the
+    #: concurrent request slots. Further connections are immediately
+    #: rejected with a 503 status code.
+    max_queued_connections = 4
+
+    #: The number of seconds that clients are asked to wait before retrying
+    #: a rejected request, sent in the ``Retry-After`` header.
+    retry_after = 1
+
+    #: The number of seconds that a new connection may wait for a request
+    #: slot and then take to send its first request.
+    request_timeout = 5
+
+    #: The number of seconds that a rejected connection is given to send its
+    #: request line and headers before the 503 response is written.
+    reject_timeout = 1
+
+    def __init__(self):
+        super().__init__()
+        self.idle_connections = 0
+        self.active_requests = 0
+        self.queued_connections = 0
+        self._slot_released = asyncio.Event()
+
     async def start_server(self, host='0.0.0.0', port=5000, debug=False,
                            ssl=None):
         """Start the Microdot web server as a coroutine. This coroutine does
@@ -250,6 +512,7 @@ class Microdot(BaseMicrodot):
             asyncio.run(main())
         """
         self.debug = debug
+        self.shutdown_requested = False
 
         async def serve(reader, writer):
             if not hasattr(writer, 'awrite'):  # pragma: no cover
@@ -322,30 +585,191 @@ class Microdot(BaseMicrodot):
                                       ssl=ssl))
 
     def shutdown(self):
+        self.shutdown_requested = True
         self.server.close()
 
     async def handle_request(self, reader, writer):
-        req = None
+        if not await self._admit(reader, writer):
+            return
+        has_slot = True
+        buffer = _StreamBuffer(reader, Request.max_header_length)
+        peername = writer.get_extra_info('peername')
+        pending = None
+        served = 0
+        idle = False
+        try:
+            while True:
+                req = None
+                buffer.timeout = None
+                try:
+                    if served:
+                        if pending is None:
+                            pending = asyncio.create_task(Request.create(
+                                self, reader, writer, peername, buffer))
+                        if has_slot and not pending.done():
+                            self._release_slot()
+                            has_slot = False
+                        try:
+                            req = await asyncio.wait_for(
+                                pending, self.keep_alive_timeout)
+                        finally:
+                            pending = None
+                            self.idle_connections -= 1
+                            idle = False
+                        if req is None:
+                            break  # the client has closed the connection
+                        if not has_slot:
+                            await self._acquire_slot()
+                            has_slot = True
+                    else:
+                        req = await asyncio.wait_for(
+                            Request.create(self, reader, writer, peername,
+                                           buffer),
+                            self.request_timeout)
+                        if req is None:
+                            break  # the client has closed the connection
+                except asyncio.TimeoutError:
+                    break
+                except Exception as exc:  # pragma: no cover
+                    if served:
+                        break  # the persistent connection has been lost
+                    print_exception(exc)
+                served += 1
+                if req is not None and req._stream is None and \
+                        self.pipeline_requests:
+                    # the body has been read, so the next request can be
+                    # parsed while this one is handled and its response is
+                    # written
+                    pending = asyncio.create_task(Request.create(
+                        self, reader, writer, peername, buffer))
+                else:
+                    buffer.timeout = Request.socket_read_timeout
+
+                res = await self.dispatch_request(req)
+                keep_alive = False
+                if res != Response.already_handled:  # pragma: no branch
+                    res.complete()
+                    keep_alive = self.keep_alive(req, res, served)
+                    res.headers['Connection'] = \
+                        'keep-alive' if keep_alive else 'close'
+                    if hasattr(res.body, '__anext__'):
+                        # long-lived streams do not hold a request slot
+                        self._release_slot()
+                        has_slot = False
+                    await res.write(writer)
+                    if keep_alive:
+                        # counted only once the response has been written,
+                        # so a failed write cannot leak an idle connection
+                        self.idle_connections += 1
+                        idle = True
+                if self.debug and req:  # pragma: no cover
+                    print('{method} {path} {status_code}'.format(
+                        method=req.method, path=req.path,
+                        status_code=res.status_code))
+                if not keep_alive:
+                    break
+        finally:
+            if pending is not None:
+                pending.cancel()
+            if has_slot:
+                self._release_slot()
+            if idle:
+                self.idle_connections -= 1
+            try:
+                await writer.aclose()
+            except OSError as exc:  # pragma: no cover
+                if exc.errno in MUTED_SOCKET_ERRORS:
+                    pass
+                else:
+                    raise
+
+    async def _admit(self, reader, writer):
+        """Acquire a request slot for a new connection.
+
+        If all slots are taken, the connection waits in the queue for up to
+        ``request_timeout`` seconds. If the queue is full or the wait times
+        out, the request head is discarded, a 503 response is sent, the
+        connection is closed and ``False`` is returned.
+        """
+        if self.active_requests < self.max_concurrent_requests:
+            self.active_requests += 1
+            return True
+        if self.queued_connections < self.max_queued_connections:
+            self.queued_connections += 1
+            try:
+                await asyncio.wait_for(self._acquire_slot(),
+                                       self.request_timeout)
+                return True
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                self.queued_connections -= 1
         try:
-            req = await Request.create(self, reader, writer,
-                                       writer.get_extra_info('peername'))
-        except Exception as exc:  # pragma: no cover
-            print_exception(exc)
-
-        res = await self.dispatch_request(req)
-        if res != Response.already_handled:  # pragma: no branch
-            await res.write(writer)
+            # closing a socket with unread data resets the connection, and
+            # the client would then not see the response
+            await asyncio.wait_for(self._discard_head(reader),
+                                   self.reject_timeout)
+        except (OSError, asyncio.TimeoutError):
+            pass
         try:
+            await writer.awrite(
+                'HTTP/1.1 503 Service Unavailable\r\nRetry-After: {}\r\n'
+                'Content-Length: 0\r\nConnection: close\r\n\r\n'.format(
+                    self.retry_after).encode())
             await writer.aclose()
-        except OSError as exc:  # pragma: no cover
-            if exc.errno in MUTED_SOCKET_ERRORS:
-                pass
-            else:
-                raise
-        if self.debug and req:  # pragma: no cover
-            print('{method} {path} {status_code}'.format(
-                method=req.method, path=req.path,
-                status_code=res.status_code))
+        except OSError:  # pragma: no cover
+            pass
+        return False
+
+    async def _discard_head(self, reader):
+        received = 0
+        tail = b''
+        while received < Request.max_header_length:
+            data = await reader.read(128)
+            if not data:
+                return
+            received += len(data)
+            tail += data
+            if b'\r\n\r\n' in tail:
+                return
+            tail = tail[-3:]
+
+    async def _acquire_slot(self):
+        while self.active_requests >= self.max_concurrent_requests:
+            self._slot_released.clear()
+            await self._slot_released.wait()
+        self.active_requests += 1
+
+    def _release_slot(self):
+        self.active_requests -= 1
+        self._slot_released.set()
+
+    def keep_alive(self, req, res, served):
+        """Decide whether the connection is kept open after the response.
+
+        :param req: The request that has been handled.
+        :param res: The response that will be sent.
+        :param served: The number of requests served over the connection,
+                       including this one.
+
+        The connection is only kept open if the client asked for it, the
+        request body has been read completely, the response length is known
+        and the connection limits have not been reached.
+        """
+        if req is None or self.shutdown_requested:
+            return False
+        connection = req.headers.get('Connection', '').lower()
+        if req.http_version == '1.0':
+            if connection != 'keep-alive':
+                return False
+        elif connection == 'close':
+            return False
+        if req.content_length > Request.max_body_length:
+            return False
+        if 'Content-Length' not in res.headers:
+            return False
+        return served < self.max_keep_alive_requests and \
+            self.idle_connections < self.max_idle_connections
 
     async def dispatch_request(self, req):
         after_request_handled = False
@@ -103,6 +103,8 @@ class CORS:
         return cors_headers
 
     def after_request(self, request, response):
+        if request is None:
+            return  # the request could not be parsed
         saved_vary = response.headers.get('Vary')
         response.headers.update(self.get_cors_headers(request))
         if saved_vary and saved_vary != response.headers.get('Vary'):
@@ -1,10 +1,20 @@
 """Setup the Microdot server in asyncio mode."""
+import uasyncio as asyncio
+
+from hashlib import sha256
 from microdot import Request
+from microdot_asyncio import Response
+from ubinascii import hexlify
+from utoolkit.config import settings
+from utoolkit.files import hash_file
 
-from .base import server
-from .signals import API_SCHEMA as SIGNALS_API_SCHEMA, shutdown as signals_shutdown
-from .system import API_SCHEMA as SYSTEM_API_SCHEMA
-from .turnouts import API_SCHEMA as TURNOUTS_API_SCHEMA, shutdown as turnouts_shutdown
+from . import events, metrics, system  # noqa: F401
+from .base import etag_matches, not_modified, server
+from .registry import close as registry_close, restore as registry_restore
+from .signals import shutdown as signals_shutdown
+from .turnouts import shutdown as turnouts_shutdown
+from .udp import serve as udp_serve, shutdown as udp_shutdown
+from .watchdog import watch
 
 
 @server.get('/')
@@ -24,47 +34,55 @@ async def get_openapi_explorer(request: Request):  # noqa: ANN201
 """, 200, {'Content-Type': 'text/html; charset=UTF-8'}
 
 
+#: The OpenAPI schema document, which is streamed from flash instead of being held in memory
+schema_filename = __file__[:__file__.rfind('/') + 1] + 'openapi.json'
+schema_etag = None
+schema_length = 0
+
+
+def hash_schema() -> None:
+    """Calculate the ETag and the length of the OpenAPI schema document."""
+    global schema_etag, schema_length
+    hasher = sha256()
+    schema_length = hash_file(schema_filename, hasher, memoryview(bytearray(256)))
+    schema_etag = '"' + hexlify(hasher.digest()[:8]).decode() + '"'
+
+
 @server.get('/api/schema')
-async def get_schema(request: Request) -> dict:
+async def get_schema(request: Request):  # noqa: ANN201
     """Return the OpenAPI schema document."""
-    schema = {
-        'version': '3.1',
-        'info': {
-            'title': 'Model Railway Thin Controller',
-            'version': '0.2.0'
-        },
-        'components': {
-            'schemas': {}
-        },
-        'paths': {
-            '/': {
-                'get': {
-                    'summary': 'User: API Documentation',
-                    'description': 'Access this API console'
-                }
-            },
-            '/api/schema': {
-                'get': {
-                    'summary': 'Schema: Definition',
-                    'description': 'Fetch the OpenAPI schema document for this API'
-                }
-            }
-        }
-    }
-    schema['components']['schemas'].update(SIGNALS_API_SCHEMA['schemas'])
-    schema['components']['schemas'].update(TURNOUTS_API_SCHEMA['schemas'])
-    schema['paths'].update(SIGNALS_API_SCHEMA['paths'])
-    schema['paths'].update(SYSTEM_API_SCHEMA['paths'])
-    schema['paths'].update(TURNOUTS_API_SCHEMA['paths'])
-    return schema
+    if schema_etag is None:
+        hash_schema()
+    if etag_matches(request, schema_etag):
+        return not_modified(schema_etag)
+    return Response(open(schema_filename, 'rb'), 200, {
+        'Content-Type': 'application/json; charset=UTF-8',
+        'Content-Length': str(schema_length),
+        'ETag': schema_etag
+    })
+
+
+async def main() -> None:
+    """Restore the signals and turnouts and then run the server.
+
+    The event loop watchdog is started and, if the "UDP.PORT" setting is configured, the UDP command listener is
+    started on that port.
+    """
+    registry_restore()
+    asyncio.create_task(watch())
+    if 'UDP.PORT' in settings:
+        asyncio.create_task(udp_serve(settings.typed('UDP.PORT')))
+    await server.start_server(port=80)
 
 
 def start_server() -> None:
     """Run the server."""
-    server.run(port=80)
+    asyncio.run(main())
 
 
 def shutdown_server() -> None:
     """Shut down the server."""
+    registry_close()
+    udp_shutdown()
     signals_shutdown()
     turnouts_shutdown()
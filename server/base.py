@@ -1,14 +1,20 @@
 """Base server class for the API server."""
 from machine import Pin
 from microdot import Request, Response
-from microdot_asyncio import Microdot
+from microdot_asyncio import Microdot, Response as AsyncResponse
 from microdot_cors import CORS
+from os import urandom
+from ubinascii import hexlify
 
 
+#: Allow file uploads larger than microdot's default of 16 KB. Larger bodies are streamed, not held in memory.
+Request.max_content_length = 512 * 1024
+
 server = Microdot()
 cors = CORS(server, allowed_origins="*")
 busy = 0
 busy_led = Pin("LED")
+boot_id = hexlify(urandom(4)).decode()
 
 
 @server.before_request
@@ -26,3 +32,82 @@ def stop_busy(request: Request, response: Response):  # noqa: ANN201
     busy = busy - 1
     if busy == 0:
         busy_led.off()
+
+
+def collection_etag(version: int) -> str:
+    """Return the ETag for the given collection version.
+
+    The ETag includes a random per-boot identifier, as versions restart from 0 after every reset.
+    """
+    return f'"{boot_id}-{version}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Check whether the request's If-None-Match header matches the given ETag."""
+    header = request.headers.get("If-None-Match")
+    if header is None:
+        return False
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag == etag or tag == "*":
+            return True
+    return False
+
+
+def not_modified(etag: str) -> AsyncResponse:
+    """Return a 304 Not Modified response for the given ETag."""
+    return AsyncResponse(b"", 304, {"ETag": etag}, reason="Not Modified")
+
+
+def json_array(items: list) -> bytes:
+    """Join already serialised JSON values into a serialised JSON array."""
+    return b"[" + b", ".join(items) + b"]"
+
+
+class JSONArrayStream:
+    """Stream already serialised JSON values as a serialised JSON array.
+
+    Each value is written separately, so the array is never held in memory as a whole.
+    """
+
+    def __init__(self: "JSONArrayStream", items: list) -> None:
+        """Initialise the stream for the list of serialised values."""
+        self._items = items
+        self._idx = -1
+
+    def __iter__(self: "JSONArrayStream") -> "JSONArrayStream":
+        """Return this stream as the iterator."""
+        return self
+
+    def __next__(self: "JSONArrayStream") -> bytes:
+        """Return the next part of the serialised array."""
+        self._idx = self._idx + 1
+        if self._idx > len(self._items):
+            raise StopIteration()
+        elif self._idx == len(self._items):
+            return b"]"
+        elif self._idx == 0:
+            return b"[" + self._items[0]
+        else:
+            return b", " + self._items[self._idx]
+
+
+def json_response(body: bytes, headers: dict | None = None) -> AsyncResponse:
+    """Return a response with an already serialised JSON body."""
+    response = AsyncResponse(body, 200, headers)
+    response.headers["Content-Type"] = "application/json; charset=UTF-8"
+    return response
+
+
+def json_array_response(items: list, headers: dict | None = None) -> AsyncResponse:
+    """Return a response with a JSON array of already serialised values.
+
+    Small arrays are sent as a single body, larger arrays are streamed using a :class:`JSONArrayStream`.
+    """
+    length = 2 + sum([len(item) for item in items]) + 2 * max(len(items) - 1, 0)
+    if length <= AsyncResponse.max_single_write_body:
+        response = json_response(json_array(items), headers)
+    else:
+        response = json_response(JSONArrayStream(items), headers)
+        response.headers["Content-Length"] = str(length)
+    return response
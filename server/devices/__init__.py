@@ -0,0 +1,4 @@
+"""The signal and turnout types.
+
+Each type is implemented in its own module, which is only imported when the first device of that type is created.
+"""
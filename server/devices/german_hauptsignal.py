@@ -0,0 +1,101 @@
+"""The German main signal type."""
+import json
+
+from machine import Pin
+
+from ..events import publish
+from ..signals import changed
+from ..udp import index_available, register
+
+
+class GermanHauptsignal:
+    """A German-style main signal.
+
+    Supports the following states:
+
+    * **off**: All lights off
+    * **danger**: Red light only
+    * **clear**: Green light only
+
+    The position of a state in :attr:`states` is its state code in the UDP command protocol.
+    """
+
+    __slots__ = ("id", "index", "_red_pin", "_green_pin", "_red", "_green", "_state", "_json")
+
+    #: The supported states
+    states = ("off", "danger", "clear")
+
+    def __init__(self: "GermanHauptsignal", config: dict) -> None:
+        """Initialise and set the signal to 'danger'."""
+        self.id = config["id"]
+        self._red_pin = config["params"]["red_pin"]
+        self._green_pin = config["params"]["green_pin"]
+        self._red = Pin(self._red_pin, Pin.OUT)
+        self._green = Pin(self._green_pin, Pin.OUT)
+        # Only registered once the pins exist, so that a failed construction does not leave the index taken
+        self.index = register(self, config.get("index"), self.set_signal)
+        self._state = ""
+        self._json = None
+        self.set_signal({"state": "danger"})
+
+    @classmethod
+    def validate_create(cls, body: dict) -> bool:  # noqa: ANN001, ANN102
+        """Validate that the body is a valid config for this signal."""
+        if body is not None and isinstance(body, dict):
+            if "type" in body and body["type"] == "GermanHauptsignal":
+                if "params" in body and isinstance(body["params"], dict):
+                    if "red_pin" in body["params"] and "green_pin" in body["params"]:
+                        return "index" not in body or index_available(body["index"])
+        return False
+
+    def validate_update(self: "GermanHauptsignal", body) -> bool:  # noqa: ANN001
+        """Validate that the body is a valid instruction for this signal."""
+        if body is not None and isinstance(body, dict):
+            if "state" in body and isinstance(body["state"], str):
+                if body["state"] in self.states:
+                    return True
+        return False
+
+    def set_signal(self: "GermanHauptsignal", body: dict) -> None:
+        """Set the signal to the state specified in the body."""
+        previous = self._state
+        if body["state"] == "off":
+            self._state = "off"
+            self._red.off()
+            self._green.off()
+        elif body["state"] == "danger":
+            self._state = "danger"
+            self._red.on()
+            self._green.off()
+        elif body["state"] == "clear":
+            self._state = "clear"
+            self._red.off()
+            self._green.on()
+        if self._state != previous:
+            self._json = None
+            changed(state_only=True)
+            publish("signal", self.id, self._state)
+
+    @property
+    def state(self: "GermanHauptsignal") -> str:
+        """The current state of the signal."""
+        return self._state
+
+    def as_json(self: "GermanHauptsignal") -> dict:
+        """Return this GermanHauptsignal in its JSON representation."""
+        return {
+            "id": self.id,
+            "type": "GermanHauptsignal",
+            "index": self.index,
+            "params": {"red_pin": self._red_pin, "green_pin": self._green_pin},
+            "state": self._state,
+        }
+
+    def as_json_bytes(self: "GermanHauptsignal") -> bytes:
+        """Return this GermanHauptsignal in its serialised JSON representation.
+
+        The serialised form is cached until the state changes.
+        """
+        if self._json is None:
+            self._json = json.dumps(self.as_json()).encode()
+        return self._json
@@ -0,0 +1,218 @@
+"""The two-pin solenoid turnout type."""
+import json
+import uasyncio as asyncio
+
+from machine import Pin
+
+from ..events import publish
+from ..turnouts import changed, scheduler
+from ..udp import index_available, register
+
+
+class TwoPinSolenoidTurnout:
+    """A Two-Pin Solenoid Turnout.
+
+    The two pins are:
+
+    * **enable_pin** - The pin to turn on power to the solenoid
+    * **direction_pin** - The pin to control the electricity flow direction
+
+    Additionally the parameter **turnout_high** Determines whether the
+    "turn" position is achieved by driving the **direction_pin** high or
+    low. The optional parameter **self_test** (default ``true``) determines
+    whether the turnout is moved through all positions after creation and
+    the optional parameter **coil_current** specifies the current in mA that
+    the solenoid draws, which is used by the :class:`ActuationScheduler`.
+
+    Supports the following states:
+
+    * **off**: Undetermined state
+    * **straight**: Turnout set to straight ahead
+    * **turn**: Turnout set to turn
+
+    The position of a state in :attr:`states` is its state code in the UDP command protocol.
+
+    The progress of the self-test is reported as one of:
+
+    * **pending**: Waiting to start
+    * **running**: Moving through the positions
+    * **done**: Completed
+    * **interrupted**: Stopped because the turnout was set while testing
+    * **skipped**: Disabled via the **self_test** parameter
+    * **restored**: Not run, as the turnout was restored after a restart
+    """
+
+    #: Time in seconds between powering the solenoid and setting the direction
+    settle_time = 0.01
+    #: Time in seconds that the solenoid is powered to move the turnout
+    pulse_time = 0.1
+
+    #: Time in seconds that the self-test is deferred after creation
+    self_test_delay = 0.1
+
+    #: The supported states
+    states = ("off", "straight", "turn")
+
+    __slots__ = (
+        "id",
+        "index",
+        "_enable_pin",
+        "_direction_pin",
+        "_enable",
+        "_direction",
+        "_turnout_high",
+        "coil_current",
+        "_state",
+        "_self_test_enabled",
+        "_self_test",
+        "_json",
+    )
+
+    def __init__(self: "TwoPinSolenoidTurnout", config: dict, state: str | None = None) -> None:
+        """Initialise and set the turnout to 'off'.
+
+        Unless disabled, the straight - turn - straight self-test is scheduled as a background task. If a `state` is
+        given, the turnout is being restored after a restart and is set to that state instead.
+        """
+        self.id = config["id"]
+        self._enable_pin = config["params"]["enable_pin"]
+        self._direction_pin = config["params"]["direction_pin"]
+        self._enable = Pin(self._enable_pin, Pin.OUT)
+        self._direction = Pin(self._direction_pin, Pin.OUT)
+        # Only registered once the pins exist, so that a failed construction does not leave the index taken
+        self.index = register(self, config.get("index"), self.set_turnout)
+        self._turnout_high = config["params"]["turnout_high"]
+        self.coil_current = config["params"].get("coil_current", scheduler.default_coil_current)
+        self._state = ""
+        self._json = None
+        self._self_test_enabled = config["params"].get("self_test", True)
+        if state is not None:
+            self._self_test = "restored"
+            if state != "":
+                self.set_turnout({"state": state})
+        elif self._self_test_enabled:
+            self._self_test = "pending"
+            asyncio.create_task(self._run_self_test())
+        else:
+            self._self_test = "skipped"
+
+    async def _run_self_test(self: "TwoPinSolenoidTurnout") -> None:
+        """Move the turnout through all positions, ending in 'straight'.
+
+        Stops early if the turnout is explicitly set while testing.
+        """
+        await asyncio.sleep(self.self_test_delay)
+        self._set_self_test("running")
+        previous = ""
+        for state in ("straight", "turn", "straight"):
+            if previous:
+                await asyncio.sleep(0.5)
+            if self._state != previous:
+                self._set_self_test("interrupted")
+                return
+            self._state = state
+            self._json = None
+            changed(state_only=True)
+            publish("turnout", self.id, state)
+            await scheduler.throw(self, state)
+            previous = state
+        self._set_self_test("done" if self._state == previous else "interrupted")
+
+    def _set_self_test(self: "TwoPinSolenoidTurnout", status: str) -> None:
+        """Update the self-test status."""
+        self._self_test = status
+        self._json = None
+        changed(state_only=True)
+
+    @classmethod
+    def validate_create(cls, body: dict) -> bool:  # noqa: ANN001, ANN102
+        """Validate that the body is a valid config for this turnout."""
+        if body is not None and isinstance(body, dict):
+            if "type" in body and body["type"] == "TwoPinSolenoidTurnout":
+                if "params" in body and isinstance(body["params"], dict):
+                    if (
+                        "enable_pin" in body["params"]
+                        and "direction_pin" in body["params"]
+                        and "turnout_high" in body["params"]
+                    ):  # noqa: E501
+                        if "self_test" in body["params"] and not isinstance(body["params"]["self_test"], bool):
+                            return False
+                        if "coil_current" in body["params"] and not isinstance(body["params"]["coil_current"], int):
+                            return False
+                        return "index" not in body or index_available(body["index"])
+        return False
+
+    def validate_update(self: "TwoPinSolenoidTurnout", body) -> bool:  # noqa: ANN001
+        """Validate that the body is a valid instruction for this turnout."""
+        if body is not None and isinstance(body, dict):
+            if "state" in body and isinstance(body["state"], str):
+                if body["state"] in self.states:
+                    return True
+        return False
+
+    def set_turnout(self: "TwoPinSolenoidTurnout", body: dict) -> None:
+        """Set the turnout to the state specified in the body.
+
+        Setting the state to "straight" or "turn" queues the solenoid pulse with the :class:`ActuationScheduler`
+        and returns immediately.
+        """
+        if body["state"] != self._state:
+            self._json = None
+            changed(state_only=True)
+            publish("turnout", self.id, body["state"])
+        self._state = body["state"]
+        if self._state == "off":
+            self._direction.off()
+            self._enable.off()
+        else:
+            scheduler.submit(self, self._state)
+
+    @property
+    def state(self: "TwoPinSolenoidTurnout") -> str:
+        """The current state of the turnout."""
+        return self._state
+
+    async def pulse(self: "TwoPinSolenoidTurnout", state: str) -> bool:
+        """Pulse the solenoid to move the turnout into the given state.
+
+        If the turnout is set to a different state before or while the pulse is running, the pulse is abandoned.
+        Returns whether the solenoid was fired.
+        """
+        if self._state != state:
+            return False
+        try:
+            self._enable.on()
+            await asyncio.sleep(self.settle_time)
+            if self._state != state:
+                return False
+            self._direction.value(bool(self._turnout_high) == (state == "turn"))
+            await asyncio.sleep(self.pulse_time)
+        finally:
+            self._enable.off()
+        return True
+
+    def as_json(self: "TwoPinSolenoidTurnout") -> dict:
+        """Return this TwoPinSolenoidTurnout in its JSON representation."""
+        return {
+            "id": self.id,
+            "type": "TwoPinSolenoidTurnout",
+            "index": self.index,
+            "params": {
+                "enable_pin": self._enable_pin,
+                "direction_pin": self._direction_pin,
+                "turnout_high": self._turnout_high,
+                "coil_current": self.coil_current,
+                "self_test": self._self_test_enabled,
+            },
+            "state": self._state,
+            "self_test": self._self_test,
+        }
+
+    def as_json_bytes(self: "TwoPinSolenoidTurnout") -> bytes:
+        """Return this TwoPinSolenoidTurnout in its serialised JSON representation.
+
+        The serialised form is cached until the state or self-test status changes.
+        """
+        if self._json is None:
+            self._json = json.dumps(self.as_json()).encode()
+        return self._json
@@ -0,0 +1,114 @@
+"""Server-sent event stream of signal and turnout state changes."""
+import json
+import uasyncio as asyncio
+from time import ticks_diff, ticks_ms
+
+from microdot import Request
+from microdot_asyncio import Response
+
+from .base import server
+
+
+class EventStream:
+    """The stream of events sent to a single subscribed client.
+
+    At most **max_buffered** events are held for the client. If the client falls further behind, the buffered
+    events are dropped and a single "resync" event is sent instead. Once :meth:`close` is called, the stream ends
+    and the client's connection is closed.
+
+    Writing to a client that is no longer reachable fails once the network stack gives up retransmitting, which
+    unsubscribes the stream. Until then, the write blocks and the stream is reported as :meth:`stale`.
+    """
+
+    #: Maximum number of events buffered per client
+    max_buffered = 16
+    #: Time in seconds after which a comment is sent to keep an idle stream open, so that lost clients are detected
+    keep_alive_interval = 5
+    #: Time in seconds after which a stream whose last event has not been written is considered lost
+    stale_timeout = 10
+
+    def __init__(self: "EventStream") -> None:
+        """Initialise an empty stream."""
+        self._buffer = []
+        self._overflow = False
+        self._closed = False
+        self._writing = None
+        self._ready = asyncio.Event()
+
+    def push(self: "EventStream", event: bytes) -> None:
+        """Add an encoded event to the stream."""
+        if len(self._buffer) >= self.max_buffered:
+            self._buffer = []
+            self._overflow = True
+        self._buffer.append(event)
+        self._ready.set()
+
+    def close(self: "EventStream") -> None:
+        """End the stream."""
+        self._closed = True
+        self._ready.set()
+
+    def stale(self: "EventStream") -> bool:
+        """Return whether writing the last event to the client has been blocked for **stale_timeout** seconds."""
+        return self._writing is not None and ticks_diff(ticks_ms(), self._writing) > self.stale_timeout * 1000
+
+    def __aiter__(self: "EventStream") -> "EventStream":
+        """Return this stream as the async iterator."""
+        return self
+
+    async def __anext__(self: "EventStream") -> bytes:
+        """Wait for and return the next encoded event."""
+        # the previous event has been written when the next one is requested
+        self._writing = None
+        while not self._buffer:
+            if self._closed:
+                raise StopAsyncIteration()
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), self.keep_alive_interval)
+            except asyncio.TimeoutError:
+                self._writing = ticks_ms()
+                return b": keep-alive\n\n"
+        self._writing = ticks_ms()
+        if self._overflow:
+            self._overflow = False
+            return b"event: resync\ndata: {}\n\n"
+        return self._buffer.pop(0)
+
+    async def aclose(self: "EventStream") -> None:
+        """Unsubscribe this stream."""
+        if self in streams:
+            streams.remove(self)
+
+
+#: Maximum number of concurrently subscribed clients
+max_streams = 4
+#: The subscribed clients, oldest first
+streams = []
+
+
+def publish(kind: str, id: str, state: str) -> None:
+    """Send a state change event of the given kind to all subscribed clients."""
+    if streams:
+        data = json.dumps({"id": id, "state": state})
+        event = ("event: " + kind + "\ndata: " + data + "\n\n").encode()
+        for stream in streams:
+            stream.push(event)
+
+
+@server.get("/api/events")
+async def get_events(request: Request):  # noqa: ANN201
+    """Subscribe to the stream of state change events.
+
+    If **max_streams** clients are subscribed, the streams of lost clients are closed to make room. If all the
+    subscribed clients are still reachable, 503 Service Unavailable is returned.
+    """
+    if len(streams) >= max_streams:
+        for lost in [stream for stream in streams if stream.stale()]:
+            streams.remove(lost)
+            lost.close()
+        if len(streams) >= max_streams:
+            return None, 503, {"Retry-After": str(server.retry_after)}
+    stream = EventStream()
+    streams.append(stream)
+    return Response(stream, 200, {"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
@@ -0,0 +1,207 @@
+"""Request and actuation metrics.
+
+The metrics are served at ``/api/metrics`` in the Prometheus text exposition format. Durations are recorded in
+fixed-bucket histograms, which do not allocate memory when a value is observed.
+"""
+import gc
+
+from microdot import Request, Response
+from microdot_asyncio import Response as AsyncResponse
+from time import ticks_diff, ticks_ms
+
+from .base import server
+
+
+class Histogram:
+    """A histogram with fixed buckets.
+
+    The count of each bucket is stored separately and only accumulated when the histogram is rendered.
+    """
+
+    __slots__ = ("counts", "sum", "count")
+
+    #: The upper bounds of the buckets in milliseconds
+    buckets = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+    def __init__(self: "Histogram") -> None:
+        """Initialise an empty histogram."""
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self: "Histogram", value: int) -> None:
+        """Record a single value."""
+        idx = 0
+        for bound in self.buckets:
+            if value <= bound:
+                break
+            idx = idx + 1
+        self.counts[idx] = self.counts[idx] + 1
+        self.sum = self.sum + value
+        self.count = self.count + 1
+
+    def render(self: "Histogram", lines: list, name: str, labels: str) -> None:
+        """Append the histogram's lines to the list.
+
+        The labels are added to each line and, if not empty, must end with a comma.
+        """
+        total = 0
+        for idx, bound in enumerate(self.buckets):
+            total = total + self.counts[idx]
+            lines.append(name + "_bucket{" + labels + f'le="{bound}"}} {total}')
+        lines.append(name + "_bucket{" + labels + f'le="+Inf"}} {self.count}')
+        labels = "{" + labels.rstrip(",") + "}" if labels else ""
+        lines.append(f"{name}_sum{labels} {self.sum}")
+        lines.append(f"{name}_count{labels} {self.count}")
+
+
+#: The request duration histograms by URL pattern and method
+requests = {}
+#: The time that turnout pulses waited in the actuation queue
+actuation_wait = Histogram()
+#: The time that turnout solenoids were powered
+actuation_pulse = Histogram()
+#: The minimum time in milliseconds between garbage collections requested via the metrics endpoint
+gc_interval = 60000
+#: The number of and total time spent in garbage collections requested via the metrics endpoint
+gc_collections = 0
+gc_time = 0
+_last_gc = None
+#: The requests that are being handled
+active = []
+#: The maximum number of handlers that are remembered between watchdog ticks
+max_recent = 8
+#: The "METHOD /url/rule" keys of the handlers that were active at the last watchdog tick or have started since
+recent = []
+#: The number of event loop stalls by the requests that were handled at the time
+stalls = {}
+#: The total time in milliseconds that the event loop was stalled and the longest lag
+stall_time = 0
+max_lag = 0
+
+
+@server.before_request
+def start_timer(request: Request):  # noqa: ANN201
+    """Record when handling the request started."""
+    request.g.started = ticks_ms()
+    active.append(request)
+    _remember(request)
+
+
+def _remember(request: Request) -> None:
+    """Add the request's handler to the recent ones, dropping the oldest if there are already **max_recent**."""
+    key = request.method + " " + request.url_rule
+    if key not in recent:
+        if len(recent) >= max_recent:
+            recent.pop(0)
+        recent.append(key)
+
+
+@server.after_error_request
+def forget_request(request: Request, response: Response):  # noqa: ANN201
+    """Stop tracking a request whose handler failed."""
+    if request in active:
+        active.remove(request)
+
+
+@server.after_request
+def stop_timer(request: Request, response: Response):  # noqa: ANN201
+    """Record the request duration for its route."""
+    active.remove(request)
+    methods = requests.get(request.url_rule)
+    if methods is None:
+        methods = {}
+        requests[request.url_rule] = methods
+    histogram = methods.get(request.method)
+    if histogram is None:
+        histogram = Histogram()
+        methods[request.method] = histogram
+    histogram.observe(ticks_diff(ticks_ms(), request.g.started))
+
+
+def record_lag(lag: int, threshold: int) -> str | None:
+    """Record the event loop lag in milliseconds measured by the watchdog.
+
+    If the lag exceeds the threshold, the stall is counted against all handlers that ran since the previous tick and
+    their description is returned.
+    """
+    global max_lag, stall_time
+    culprits = None
+    if lag > max_lag:
+        max_lag = lag
+    if lag > threshold:
+        stall_time = stall_time + lag
+        if recent:
+            culprits = ", ".join(recent)
+            for key in recent:
+                stalls[key] = stalls.get(key, 0) + 1
+        else:
+            culprits = "no request"
+            stalls[""] = stalls.get("", 0) + 1
+    recent.clear()
+    for request in active:
+        _remember(request)
+    return culprits
+
+
+def collect_garbage() -> None:
+    """Run a garbage collection and record the time it took.
+
+    The collection is skipped if the previous one ran less than :data:`gc_interval` milliseconds ago.
+    """
+    global gc_collections, gc_time, _last_gc
+    start = ticks_ms()
+    if _last_gc is not None and ticks_diff(start, _last_gc) < gc_interval:
+        return
+    gc.collect()
+    _last_gc = ticks_ms()
+    gc_time = gc_time + ticks_diff(_last_gc, start)
+    gc_collections = gc_collections + 1
+
+
+def render(collect: bool = False) -> bytes:
+    """Render all metrics in the Prometheus text format.
+
+    If `collect` is set, a garbage collection is run first, so that the free heap is reported accurately.
+    """
+    if collect:
+        collect_garbage()
+    lines = [
+        "# TYPE http_requests_in_flight gauge",
+        f"http_requests_in_flight {len(active)}",
+        "# TYPE http_request_duration_ms histogram",
+    ]
+    for url_rule, methods in requests.items():
+        for method, histogram in methods.items():
+            histogram.render(lines, "http_request_duration_ms", f'route="{url_rule}",method="{method}",')
+    lines.append("# TYPE turnout_actuation_wait_ms histogram")
+    actuation_wait.render(lines, "turnout_actuation_wait_ms", "")
+    lines.append("# TYPE turnout_actuation_pulse_ms histogram")
+    actuation_pulse.render(lines, "turnout_actuation_pulse_ms", "")
+    lines.append("# TYPE event_loop_stalls_total counter")
+    for handler, count in stalls.items():
+        lines.append(f'event_loop_stalls_total{{handler="{handler}"}} {count}')
+    lines.append("# TYPE event_loop_stall_ms_total counter")
+    lines.append(f"event_loop_stall_ms_total {stall_time}")
+    lines.append("# TYPE event_loop_lag_max_ms gauge")
+    lines.append(f"event_loop_lag_max_ms {max_lag}")
+    lines.append("# TYPE gc_collections_total counter")
+    lines.append(f"gc_collections_total {gc_collections}")
+    lines.append("# TYPE gc_duration_ms_total counter")
+    lines.append(f"gc_duration_ms_total {gc_time}")
+    lines.append("# TYPE heap_free_bytes gauge")
+    lines.append(f"heap_free_bytes {gc.mem_free()}")
+    lines.append("# TYPE heap_allocated_bytes gauge")
+    lines.append(f"heap_allocated_bytes {gc.mem_alloc()}")
+    lines.append("")
+    return "\n".join(lines).encode()
+
+
+@server.get("/api/metrics")
+async def get_metrics(request: Request):  # noqa: ANN201
+    """Return the metrics.
+
+    A garbage collection is only run first if requested with ``?gc=1``, as it stalls the event loop.
+    """
+    body = render(request.args.get("gc") in ("1", "true"))
+    return AsyncResponse(body, 200, {"Content-Type": "text/plain; version=0.0.4; charset=UTF-8"})
@@ -0,0 +1,128 @@
+"""Persistent storage of the configured signals and turnouts.
+
+Changes are written to flash after a delay, so that a burst of changes results in a single write. Devices being
+created or deleted are written after a short delay, while state changes alone are collected for much longer, as a
+layout in use changes states constantly and every write wears the flash. The registry is restored when the server
+starts, including the last known states.
+"""
+import json
+import uasyncio as asyncio
+
+from microdot import print_exception
+from utoolkit.config import settings
+from utoolkit.files import atomic_write
+
+
+#: The file that the registry is stored in
+filename = "registry.json"
+#: Time in seconds that a write is delayed after devices are created or deleted
+save_delay = 2
+#: Time in seconds that a write is delayed after only device states have changed
+state_save_delay = settings.typed("REGISTRY.STATE_SAVE_DELAY", 60)
+
+_pending = None
+_pending_delay = None
+_closed = False
+_loading = False
+
+
+def schedule_save(state_only: bool = False) -> None:
+    """Schedule writing the registry to flash.
+
+    A pending write that is due later than the delay for this change is rescheduled.
+    """
+    global _pending, _pending_delay
+    if _closed or _loading:
+        return
+    delay = state_save_delay if state_only else save_delay
+    if _pending is not None:
+        if _pending_delay <= delay:
+            return
+        _pending.cancel()
+    _pending_delay = delay
+    _pending = asyncio.create_task(_delayed_save(delay))
+
+
+async def _delayed_save(delay: float) -> None:
+    """Write the registry to flash after the `delay` in seconds."""
+    global _pending
+    await asyncio.sleep(delay)
+    _pending = None
+    if not _closed:
+        save()
+
+
+def _encode():  # noqa: ANN202
+    """Yield the registry as JSON, encoding one device at a time.
+
+    Each device is stored as a compact ``[id, type, params, state, index]`` list.
+    """
+    from .signals import signals
+    from .turnouts import turnouts
+
+    for key, devices in (("signals", signals), ("turnouts", turnouts)):
+        yield b'{"signals": [' if key == "signals" else b'], "turnouts": ['
+        separator = b""
+        for device in devices.values():
+            obj = device.as_json()
+            yield separator
+            yield json.dumps([obj["id"], obj["type"], obj["params"], obj["state"], obj["index"]]).encode()
+            separator = b", "
+    yield b"]}"
+
+
+def save() -> None:
+    """Write the registry to flash."""
+    try:
+        atomic_write(filename, _encode())
+    except OSError as e:
+        print_exception(e)
+
+
+def close() -> None:
+    """Write any pending changes and stop writing further changes.
+
+    Called before shutting down, so that switching all devices off is not stored.
+    """
+    global _pending, _closed
+    if _pending is not None:
+        _pending.cancel()
+        _pending = None
+        save()
+    _closed = True
+
+
+def restore() -> None:
+    """Restore the signals and turnouts from flash."""
+    global _loading
+    from .signals import signal_type, signals
+    from .turnouts import reserved_ids, turnout_type, turnouts
+
+    try:
+        with open(filename) as in_f:
+            data = json.load(in_f)
+    except OSError:
+        return
+    _loading = True
+    try:
+        for entry in data.get("signals", []):
+            id, type_, params, state = entry[:4]
+            config = {"id": id, "type": type_, "params": params}
+            if len(entry) > 4:
+                config["index"] = entry[4]
+            cls = signal_type(type_)
+            if id not in signals and cls is not None and cls.validate_create(config):
+                signals[id] = cls(config)
+                signals[id].set_signal({"state": state})
+        for entry in data.get("turnouts", []):
+            id, type_, params, state = entry[:4]
+            config = {"id": id, "type": type_, "params": params}
+            if len(entry) > 4:
+                config["index"] = entry[4]
+            cls = turnout_type(type_)
+            if id not in turnouts and id not in reserved_ids and cls is not None and cls.validate_create(config):
+                turnouts[id] = cls(config, state=state)
+    except Exception as e:
+        print_exception(e)
+    finally:
+        _loading = False
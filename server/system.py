@@ -1,75 +1,25 @@
 """System control API endpoints."""
+import json
 import machine
+import os
+import struct
 
 import uasyncio as asyncio
 
-from microdot import Request
+from hashlib import sha256
+from microdot import print_exception, Request
+from ubinascii import hexlify
+from utoolkit.files import apply_journal, atomic_write, hash_file, makedirs, remove, remove_tree
+from utoolkit.mpy import file_compatible, firmware_mpy, installed, modules, revert, startup_script
 
 from .base import server
+from .registry import close as registry_close
 from .signals import shutdown as signals_shutdown
 from .turnouts import shutdown as turnouts_shutdown
+from .udp import shutdown as udp_shutdown
 from __about__ import __version__
 
 
-API_SCHEMA = {
-    "paths": {
-        "/api/system": {
-            "get": {
-                "summary": "System: Status",
-                "description": "Retrieve the current system status.",
-                "Responses": {
-                    "200": {"description": "The current status of the system."}
-                },
-            },
-            "delete": {
-                "summary": "System: Shutdown",
-                "description": "Shut down the system, powering off all attached devices.",
-                "responses": {
-                    "202": {"description": "The shutdown process has started"}
-                },
-            },
-            "patch": {
-                "summary": "System: Update",
-                "description": "Update a single file on the system",
-                "parameters": [
-                    {
-                        "name": "X-Filename",
-                        "in": "header",
-                        "required": True,
-                        "description": "The filename to save the uploaded file at.",
-                    },
-                    {
-                        "name": "Content-Length",
-                        "in": "header",
-                        "required": True,
-                        "description": "The length of the uploaded file.",
-                    },
-                ],
-                "requestBody": {
-                    "description": "The file to upload",
-                    "content": {"*/*": {}},
-                    "required": True,
-                },
-                "responses": {
-                    "204": {"description": "The file has been updated"},
-                    "411": {
-                        "description": "The Content-Length header must be specified"
-                    },
-                    "422": {"description": "The X-Filename header must be specified"},
-                },
-            },
-        },
-        "/api/system/restart": {
-            "post": {
-                "summary": "System: Restart",
-                "description": "Restart the system",
-                "Responses": {"202": {"description": "The restart has started."}},
-            }
-        },
-    }
-}
-
-
 @server.get("/api/system")
 async def get_system_status(request: Request):  # noqa: ANN201
     """Return the current system status."""
@@ -82,6 +32,8 @@ async def shutdown(request: Request) -> None:
     This ensures that all signals are switched off before stopping.
     """
     await asyncio.sleep(1)
+    registry_close()
+    udp_shutdown()
     signals_shutdown()
     turnouts_shutdown()
     request.app.shutdown()
@@ -94,19 +46,112 @@ async def delete_server(request: Request):  # noqa: ANN201
     return None, 202
 
 
+#: The buffer that uploads are received into
+upload_buffer = memoryview(bytearray(1024))
+_uploading = False
+
+#: The directory that bundles are unpacked into
+staging_dir = "staging"
+#: The journal of the files that are moved into place. It is also applied by main.py when starting.
+journal_filename = "bundle.journal"
+#: The maximum length of a bundle's manifest
+max_manifest_length = 4096
+
+
+async def receive(stream, out_f, size: int, hasher) -> int:  # noqa: ANN001
+    """Copy `size` bytes from the stream into the file via the upload buffer, updating the hasher.
+
+    Returns the number of bytes copied, which is less than `size` if the stream ended early, a read timed out, or the
+    connection failed.
+    """
+    received = 0
+    while received < size:
+        remaining = size - received
+        buffer = upload_buffer if remaining >= len(upload_buffer) else upload_buffer[:remaining]
+        try:
+            length = await stream.readinto(buffer)
+        except (OSError, asyncio.TimeoutError):
+            break
+        if not length:
+            break
+        if length < len(buffer):
+            buffer = buffer[:length]
+        out_f.write(buffer)
+        hasher.update(buffer)
+        received = received + length
+    return received
+
+
+def parse_content_range(header: str) -> tuple | None:
+    """Parse a ``bytes start-end/total`` Content-Range header into a ``(start, end, total)`` tuple."""
+    if not header.startswith("bytes "):
+        return None
+    try:
+        range_, total = header[6:].split("/")
+        start, end = range_.split("-")
+        start, end, total = int(start), int(end), int(total)
+    except ValueError:
+        return None
+    if start < 0 or start > end or end >= total:
+        return None
+    return start, end, total
+
+
 @server.patch("/api/system")
 async def patch_server(request: Request):  # noqa: ANN201
-    """Patch the server updating a file."""
+    """Patch the server updating a file.
+
+    The upload is written to a ".part" file next to the file, which is renamed to replace the file once the upload is
+    complete and verified.
+    """
+    global _uploading
     if "X-Filename" in request.headers and "Content-Length" in request.headers:
         filename = request.headers["X-Filename"]
+        if filename.endswith(".mpy") and startup_script(filename):
+            return None, 415
+        part_filename = f"{filename}.part"
         size = int(request.headers["Content-Length"])
+        start = 0
+        total = size
+        if "Content-Range" in request.headers:
+            content_range = parse_content_range(request.headers["Content-Range"])
+            if content_range is None or content_range[1] - content_range[0] + 1 != size:
+                return None, 400
+            start, _, total = content_range
+        if _uploading:
+            return None, 409
 
-        with open(filename, "wb") as out_f:
-            while size > 0:
-                chunk = await request.stream.read(min(size, 1024))
-                out_f.write(chunk)
-                size -= len(chunk)
+        _uploading = True
+        try:
+            hasher = sha256()
+            received = 0
+            if start > 0:
+                try:
+                    received = hash_file(part_filename, hasher, upload_buffer)
+                except OSError:
+                    pass
+                if received != start:
+                    return None, 416, {"X-Received-Length": str(received)}
+            with open(part_filename, "ab" if start > 0 else "wb") as out_f:
+                length = await receive(request.stream, out_f, size, hasher)
+            received = received + length
+            size = size - length
+        finally:
+            _uploading = False
 
+        if size > 0:
+            return None, 400, {"X-Received-Length": str(received)}
+        if received < total:
+            return None, 202, {"X-Received-Length": str(received)}
+        expected = request.headers.get("X-Content-SHA256")
+        if expected is not None and hexlify(hasher.digest()).decode() != expected.strip().lower():
+            remove(part_filename)
+            return None, 400
+        if filename.endswith(".mpy") and not file_compatible(part_filename):
+            remove(part_filename)
+            return None, 415
+        os.rename(part_filename, filename)
+        installed(filename)
         return None, 204
     elif "Content-Length" not in request.headers:
         return None, 411
@@ -114,6 +159,135 @@ async def patch_server(request: Request):  # noqa: ANN201
         return None, 422
 
 
+async def read_exactly(stream, size: int) -> bytes:  # noqa: ANN001
+    """Read exactly `size` bytes from the stream, raising a ValueError if it ends early or the read times out."""
+    try:
+        data = await stream.readexactly(size)
+    except (EOFError, asyncio.TimeoutError):
+        raise ValueError("Bundle is truncated")
+    if len(data) != size:
+        raise ValueError("Bundle is truncated")
+    return data
+
+
+def valid_bundle_name(name: str) -> bool:
+    """Check that the name is a relative path that stays within the application directory."""
+    if not name or name.startswith("/") or name == journal_filename:
+        return False
+    for part in name.split("/"):
+        if part in ("", ".", ".."):
+            return False
+    return True
+
+
+async def unpack_bundle(stream, size: int) -> list:  # noqa: ANN001
+    """Unpack the bundle from the stream into the staging directory and return the unpacked filenames.
+
+    Raises a ValueError if the bundle is malformed or the files do not match the manifest.
+    """
+    remove_tree(staging_dir)
+    makedirs(staging_dir)
+    (manifest_length,) = struct.unpack("!I", await read_exactly(stream, 4))
+    if manifest_length > max_manifest_length:
+        raise ValueError("Manifest is too long")
+    manifest = json.loads((await read_exactly(stream, manifest_length)).decode())
+    if not isinstance(manifest, dict):
+        raise ValueError("Manifest is not an object")
+    consumed = 4 + manifest_length
+    names = []
+    while consumed < size:
+        (name_length,) = struct.unpack("!H", await read_exactly(stream, 2))
+        name = (await read_exactly(stream, name_length)).decode()
+        (length,) = struct.unpack("!I", await read_exactly(stream, 4))
+        consumed = consumed + 6 + name_length + length
+        if consumed > size:
+            raise ValueError("Bundle is truncated")
+        if not valid_bundle_name(name) or name not in manifest or name in names:
+            raise ValueError(f"Unexpected file {name}")
+        if name.endswith(".mpy") and startup_script(name):
+            raise ValueError(f"{name} cannot replace the start-up script")
+        staged = f"{staging_dir}/{name}"
+        if "/" in name:
+            makedirs(staged[:staged.rfind("/")])
+        hasher = sha256()
+        with open(staged, "wb") as out_f:
+            if await receive(stream, out_f, length, hasher) != length:
+                raise ValueError("Bundle is truncated")
+        if hexlify(hasher.digest()).decode() != str(manifest[name]).lower():
+            raise ValueError(f"Hash mismatch for {name}")
+        if name.endswith(".mpy") and not file_compatible(staged):
+            raise ValueError(f"{name} is not compatible with the firmware")
+        names.append(name)
+    if len(names) != len(manifest):
+        raise ValueError("Bundle is missing files")
+    return names
+
+
+@server.post("/api/system/bundle")
+async def post_bundle(request: Request):  # noqa: ANN201
+    """Deploy a bundle of files.
+
+    The files are unpacked and verified in the staging directory. They are then moved into place following a journal,
+    so that a move interrupted by a power loss is completed when the system starts.
+    """
+    global _uploading
+    if "Content-Length" not in request.headers:
+        return None, 411
+    if _uploading:
+        return None, 409
+
+    _uploading = True
+    names = None
+    try:
+        names = await unpack_bundle(request.stream, request.content_length)
+    except (OSError, ValueError, asyncio.TimeoutError) as e:
+        print_exception(e)
+        return None, 400
+    finally:
+        _uploading = False
+        if names is None:
+            remove_tree(staging_dir)
+
+    atomic_write(journal_filename, json.dumps({"staging": staging_dir, "files": names}).encode())
+    apply_journal(journal_filename, installed)
+    if request.args.get("restart") in ("1", "true"):
+        asyncio.create_task(restart(request))
+        return None, 202
+    return None, 204
+
+
+@server.get("/api/system/modules")
+async def get_modules(request: Request):  # noqa: ANN201
+    """Return the installed .mpy modules."""
+    mpy = firmware_mpy()
+    result = {
+        "mpy": None if mpy is None else {"version": mpy & 0xFF, "sub_version": (mpy >> 8) & 0x03, "arch": mpy >> 10},
+        "modules": [],
+    }
+    for filename in modules():
+        if not filename.startswith(f"{staging_dir}/"):
+            try:
+                os.stat(f"{filename[:-4]}.py.fallback")
+                fallback = True
+            except OSError:
+                fallback = False
+            result["modules"].append({"name": filename, "compatible": file_compatible(filename), "fallback": fallback})
+    return result
+
+
+@server.delete("/api/system/modules/<path:name>")
+async def delete_module(request: Request, name: str):  # noqa: ANN201
+    """Remove a .mpy module, restoring its .py fallback."""
+    if name.endswith(".mpy") and valid_bundle_name(name):
+        try:
+            os.stat(name)
+        except OSError:
+            return None, 404
+        revert(name)
+        return None, 204
+    return None, 404
+
+
 async def restart(request: Request):  # noqa: ANN201
     """Restart the system by resetting it."""
     await shutdown(request)
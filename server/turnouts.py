@@ -1,250 +1,187 @@
 """Turnout control API endpoints."""
-from machine import Pin
+import uasyncio as asyncio
+
 from microdot import Request
-from time import sleep
-
-from .base import server
-
-
-API_SCHEMA = {
-    "schemas": {
-        "CreateTurnout": {
-            "type": "object",
-            "properties": {
-                "type": {"type": "String"},
-                "params": {
-                    "type": "object",
-                    "id": {"type": "string"},
-                    "properties": {"^S_": {"type": "string"}},
-                },
-            },
-        },
-        "Turnout": {
-            "type": "object",
-            "properties": {
-                "id": {"type": "string"},
-                "type": {"type": "string"},
-                "params": {"type": "object", "properties": {"^S_": {"type": "string"}}},
-                "state": {"type": "string"},
-            },
-        },
-    },
-    "paths": {
-        "/api/turnouts": {
-            "get": {
-                "summary": "Turnouts: List all",
-                "description": "List all configured turnouts.",
-                "responses": {
-                    "200": {
-                        "description": "A list of all available turnouts.",
-                        "content": {
-                            "application/json": {
-                                "schema": {
-                                    "type": "array",
-                                    "items": {"$ref": "#/components/schemas/Turnout"},
-                                }
-                            }
-                        },
-                    }
-                },
-            },
-            "post": {
-                "summary": "Turnouts: Create",
-                "description": "Create a new turnout.",
-                "requestBody": {
-                    "content": {
-                        "application/json": {
-                            "schema": {"$ref": "#/components/schemas/CreateTurnout"}
-                        }
-                    }
-                },
-                "responses": {
-                    "200": {
-                        "description": "The newly created turnout.",
-                        "content": {
-                            "application/json": {
-                                "schema": {"$ref": "#/components/schemas/Turnout"}
-                            }
-                        },
-                    }
-                },
-            },
-        },
-        "/api/turnouts/{tid}": {
-            "summary": "Single turnout API endpoints",
-            "parameters": [
-                {
-                    "name": "tid",
-                    "in": "path",
-                    "description": "The identifier of the turnout to set",
-                    "required": True,
-                    "schema": {"type": "string"},
-                    "style": "simple",
-                }
-            ],
-            "get": {
-                "summary": "Turnouts: Get state",
-                "description": "Get the turnout identified by the identifier",
-                "responses": {
-                    "200": {
-                        "description": "The requested turnout object",
-                        "content": {
-                            "application/json": {
-                                "schema": {"$ref": "#/components/schemas/Turnout"}
-                            }
-                        },
-                    },
-                    "404": {
-                        "description": "No turnout exists for the given identifier",
-                    },
-                },
-            },
-            "patch": {
-                "summary": "Turnouts: Set state",
-                "description": "Set the turnout to the required state.",
-                "requestBody": {
-                    "content": {
-                        "application/json": {
-                            "schema": {
-                                "type": "object",
-                                "properties": {
-                                    "state": {
-                                        "description": "The turnout state to set",
-                                        "type": "string",
-                                    }
-                                },
-                            }
-                        }
-                    }
-                },
-                "responses": {
-                    "200": {
-                        "description": "Returns the updated turnout state.",
-                        "content": {
-                            "application/json": {
-                                "schema": {"$ref": "#/components/schemas/Turnout"}
-                            }
-                        },
-                    },
-                    "400": {"description": "The requested state is not valid"},
-                    "404": {
-                        "description": "The id does not identify an existing turnout"
-                    },
-                },
-            },
-            "delete": {
-                "summary": "Turnouts: Delete",
-                "description": "Delete the specified turnout.",
-                "responses": {
-                    "200": {"description": "The turnout has been deleted."},
-                    "404": {
-                        "description": "The id does not identify an existing turnout"
-                    },
-                },
-            },
-        },
-    },
-}
-
-
-class TwoPinSolenoidTurnout:
-    """A Two-Pin Solenoid Turnout.
-
-    The two pins are:
-
-    * **enable_pin** - The pin to turn on power to the solenoid
-    * **direction_pin** - The pin to control the electricity flow direction
-
-    Additionally the parameter **turnout_high** Determines whether the
-    "turn" position is achieved by driving the **direction_pin** high or
-    low.
-
-    Supports the following states:
-
-    * **off**: Undetermined state
-    * **straight**: Turnout set to straight ahead
-    * **turn**: Turnout set to turn
+from time import ticks_diff, ticks_ms
+from utoolkit.config import settings
+
+from .base import collection_etag, etag_matches, json_array_response, json_response, not_modified, server
+from .metrics import actuation_pulse, actuation_wait
+from .registry import schedule_save
+from .udp import unregister
+
+
+class ActuationScheduler:
+    """Fire queued turnout pulses within the power budget.
+
+    Up to **max_coils** solenoids are powered at the same time and, unless **current_budget** is 0, the sum of
+    their **coil_current** values in mA must not exceed **current_budget**. A solenoid that on its own exceeds the
+    budget is fired when no other solenoid is powered.
+
+    Pulses are fired in the order they were queued. Setting a turnout that is still waiting in the queue replaces
+    the queued state instead of queueing a second pulse.
+
+    The turnouts are expected to provide a **coil_current** attribute and an async ``pulse(state)`` method that
+    returns whether the solenoid was fired, like :class:`server.devices.two_pin_solenoid_turnout.TwoPinSolenoidTurnout`.
     """
 
-    def __init__(self: "TwoPinSolenoidTurnout", config: dict) -> None:
-        """Initialise and set the turnout to 'off'."""
-        self._config = config
-        self._enable = Pin(self._config["params"]["enable_pin"], Pin.OUT)
-        self._direction = Pin(self._config["params"]["direction_pin"], Pin.OUT)
-        self._turnout_high = self._config["params"]["turnout_high"]
-        self._state = ""
-        self.set_turnout({"state": "straight"})
-        sleep(0.5)
-        self.set_turnout({"state": "turn"})
-        sleep(0.5)
-        self.set_turnout({"state": "straight"})
-
-    @classmethod
-    def validate_create(cls, body: dict) -> bool:  # noqa: ANN001, ANN102
-        """Validate that the body is a valid config for this turnout."""
-        if body is not None and isinstance(body, dict):
-            if "type" in body and body["type"] == "TwoPinSolenoidTurnout":
-                if "params" in body and isinstance(body["params"], dict):
-                    if (
-                        "enable_pin" in body["params"]
-                        and "direction_pin" in body["params"]
-                        and "turnout_high" in body["params"]
-                    ):  # noqa: E501
-                        return True
-        return False
-
-    def validate_update(self: "TwoPinSolenoidTurnout", body) -> bool:  # noqa: ANN001
-        """Validate that the body is a valid instruction for this turnout."""
-        if body is not None and isinstance(body, dict):
-            if "state" in body and isinstance(body["state"], str):
-                if body["state"] in ["off", "straight", "turn"]:
-                    return True
-        return False
-
-    def set_turnout(self: "TwoPinSolenoidTurnout", body: dict) -> None:
-        """Set the turnout to the state specified in the body."""
-        if body["state"] == "off":
-            self._state = "off"
-            self._direction.off()
-            self._enable.off()
-        elif body["state"] == "straight":
-            self._state = "straight"
-            self._enable.on()
-            sleep(0.01)
-            if self._turnout_high:
-                self._direction.off()
-            else:
-                self._direction.on()
-            sleep(0.1)
-            self._enable.off()
-        elif body["state"] == "turn":
-            self._state = "turn"
-            self._enable.on()
-            sleep(0.01)
-            if self._turnout_high:
-                self._direction.on()
-            else:
-                self._direction.off()
-            sleep(0.1)
-            self._enable.off()
-
-    def as_json(self: "TwoPinSolenoidTurnout") -> dict:
-        """Return this TwoPinSolenoidTurnout in its JSON representation."""
+    #: Number of most recently completed throws used to calculate the throughput
+    throughput_window = 16
+
+    def __init__(
+        self: "ActuationScheduler", max_coils: int = 2, current_budget: int = 0, default_coil_current: int = 0
+    ) -> None:
+        """Initialise an empty scheduler."""
+        self.max_coils = max_coils
+        self.current_budget = current_budget
+        self.default_coil_current = default_coil_current
+        self.throws = 0
+        self._queue = []
+        self._firing = []
+        self._current = 0
+        self._completed = [0] * self.throughput_window
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def submit(self: "ActuationScheduler", turnout: object, state: str) -> list:
+        """Queue a pulse to move the turnout into the given state, returning the queue entry."""
+        for entry in self._queue:
+            if entry[0] is turnout:
+                entry[1] = state
+                return entry
+        entry = [turnout, state, None, ticks_ms()]
+        self._queue.append(entry)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        self._wakeup.set()
+        return entry
+
+    async def throw(self: "ActuationScheduler", turnout: object, state: str) -> None:
+        """Queue a pulse to move the turnout into the given state and wait until it has completed."""
+        entry = self.submit(turnout, state)
+        if entry[2] is None:
+            entry[2] = asyncio.Event()
+        await entry[2].wait()
+
+    def configure(self: "ActuationScheduler", max_coils: int | None = None, current_budget: int | None = None) -> None:
+        """Change the scheduler limits, firing any queued pulses that now fit."""
+        if max_coils is not None:
+            self.max_coils = max_coils
+        if current_budget is not None:
+            self.current_budget = current_budget
+        self._wakeup.set()
+
+    def _fits(self: "ActuationScheduler", turnout: object) -> bool:
+        """Check whether the turnout can be fired without exceeding the budget."""
+        if len(self._firing) >= self.max_coils:
+            return False
+        if self.current_budget <= 0 or len(self._firing) == 0:
+            return True
+        return self._current + turnout.coil_current <= self.current_budget
+
+    async def _run(self: "ActuationScheduler") -> None:
+        """Fire queued pulses whenever the budget allows."""
+        while True:
+            self._wakeup.clear()
+            idx = 0
+            while idx < len(self._queue):
+                turnout = self._queue[idx][0]
+                if turnout in self._firing:
+                    idx = idx + 1
+                elif self._fits(turnout):
+                    entry = self._queue.pop(idx)
+                    self._firing.append(turnout)
+                    self._current = self._current + turnout.coil_current
+                    asyncio.create_task(self._fire(entry))
+                else:
+                    break
+            await self._wakeup.wait()
+
+    async def _fire(self: "ActuationScheduler", entry: list) -> None:
+        """Fire a single pulse and release its share of the budget afterwards."""
+        turnout, state, done, queued = entry
+        started = ticks_ms()
+        actuation_wait.observe(ticks_diff(started, queued))
+        try:
+            if await turnout.pulse(state):
+                finished = ticks_ms()
+                actuation_pulse.observe(ticks_diff(finished, started))
+                self._completed[self.throws % self.throughput_window] = finished
+                self.throws = self.throws + 1
+        finally:
+            self._firing.remove(turnout)
+            self._current = self._current - turnout.coil_current
+            if done is not None:
+                done.set()
+            self._wakeup.set()
+
+    def as_json(self: "ActuationScheduler") -> dict:
+        """Return the scheduler settings and statistics in their JSON representation.
+
+        The throughput is the rate of the most recent throws, measured as the intervals between their completions, so
+        at least two throws are needed.
+        """
+        throughput = 0
+        count = min(self.throws, self.throughput_window)
+        if count > 1:
+            oldest = self._completed[(self.throws - count) % self.throughput_window]
+            newest = self._completed[(self.throws - 1) % self.throughput_window]
+            elapsed = ticks_diff(newest, oldest)
+            if elapsed > 0:
+                throughput = (count - 1) * 1000 / elapsed
         return {
-            "id": self._config["id"],
-            "type": "TwoPinSolenoidTurnout",
-            "params": self._config["params"],
-            "state": self._state,
+            "max_coils": self.max_coils,
+            "current_budget": self.current_budget,
+            "queue_depth": len(self._queue),
+            "active_coils": len(self._firing),
+            "active_current": self._current,
+            "throws": self.throws,
+            "throughput": throughput,
         }
 
 
+scheduler = ActuationScheduler(
+    max_coils=settings.typed("TURNOUTS.MAX_COILS", 2),
+    current_budget=settings.typed("TURNOUTS.CURRENT_BUDGET", 0),
+    default_coil_current=settings.typed("TURNOUTS.COIL_CURRENT", 0),
+)
+#: The modules that implement the turnout types. A module is only imported when the first turnout of its type is
+#: created.
+turnout_types = {"TwoPinSolenoidTurnout": "server.devices.two_pin_solenoid_turnout"}
+#: The ids that cannot be used for turnouts, as their URLs are taken by other endpoints
+reserved_ids = ("scheduler",)
+
 turnouts = {}
+version = 0
+
+
+def turnout_type(name: str):  # noqa: ANN201
+    """Return the class that implements the turnout type, or None if the type is not known."""
+    if isinstance(name, str) and name in turnout_types:
+        return getattr(__import__(turnout_types[name], None, None, [name]), name)
+    return None
+
+
+def changed(state_only: bool = False) -> None:
+    """Record that the turnouts have changed, invalidating the collection ETag.
+
+    Set `state_only` if only the state of a turnout has changed, so that the change is stored with a longer delay.
+    """
+    global version
+    version = version + 1
+    schedule_save(state_only)
 
 
 @server.get("/api/turnouts")
-async def get_all_turnouts(request: Request) -> list:
-    """Return all configured turnouts."""
-    return [turnout.as_json() for turnout in turnouts.values()]
+async def get_all_turnouts(request: Request):  # noqa: ANN201
+    """Return all configured turnouts.
+
+    Returns 304 Not Modified if the client already has the current version.
+    """
+    etag = collection_etag(version)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    return json_array_response([turnout.as_json_bytes() for turnout in turnouts.values()], {"ETag": etag})
 
 
 @server.post("/api/turnouts")
@@ -252,11 +189,63 @@ async def create_turnout(request: Request):  # noqa: ANN201
     """Create a new turnout."""
     config = request.json
     if config is not None and "type" in config and "id" in config:
-        if config["id"] not in turnouts:
-            if config["type"] == "TwoPinSolenoidTurnout":
-                if TwoPinSolenoidTurnout.validate_create(config):
-                    turnouts[config["id"]] = TwoPinSolenoidTurnout(config)
-                    return turnouts[config["id"]].as_json()
+        if config["id"] not in turnouts and config["id"] not in reserved_ids:
+            cls = turnout_type(config["type"])
+            if cls is not None and cls.validate_create(config):
+                changed()
+                turnouts[config["id"]] = cls(config)
+                return json_response(turnouts[config["id"]].as_json_bytes())
+    return None, 400
+
+
+@server.patch("/api/turnouts")
+async def patch_turnouts(request: Request):  # noqa: ANN201
+    """Set multiple turnouts to the given states.
+
+    All items are validated before any turnout is changed. If any item is invalid, no turnout is changed and the
+    per-item status is returned.
+    """
+    body = request.json
+    if body is None or not isinstance(body, list):
+        return None, 400
+    results = []
+    valid = True
+    for item in body:
+        if not isinstance(item, dict) or not isinstance(item.get("id"), str):
+            results.append({"id": None, "status": 400})
+            valid = False
+        elif item["id"] not in turnouts:
+            results.append({"id": item["id"], "status": 404})
+            valid = False
+        elif not turnouts[item["id"]].validate_update(item):
+            results.append({"id": item["id"], "status": 400})
+            valid = False
+        else:
+            results.append({"id": item["id"], "status": 200})
+    if not valid:
+        return results, 400
+    for item in body:
+        turnouts[item["id"]].set_turnout(item)
+    return json_array_response([turnouts[item["id"]].as_json_bytes() for item in body])
+
+
+@server.get("/api/turnouts/scheduler")
+async def get_scheduler(request: Request):  # noqa: ANN201
+    """Get the actuation scheduler settings and statistics."""
+    return scheduler.as_json()
+
+
+@server.patch("/api/turnouts/scheduler")
+async def patch_scheduler(request: Request):  # noqa: ANN201
+    """Update the actuation scheduler settings."""
+    body = request.json
+    if body is not None and isinstance(body, dict):
+        if "max_coils" in body and (not isinstance(body["max_coils"], int) or body["max_coils"] < 1):
+            return None, 400
+        if "current_budget" in body and (not isinstance(body["current_budget"], int) or body["current_budget"] < 0):
+            return None, 400
+        scheduler.configure(max_coils=body.get("max_coils"), current_budget=body.get("current_budget"))
+        return scheduler.as_json()
     return None, 400
 
 
@@ -264,7 +253,7 @@ async def create_turnout(request: Request):  # noqa: ANN201
 async def get_turnout(request: Request, tid: str):  # noqa: ANN201
     """Get a single turnout."""
     if tid in turnouts:
-        return turnouts[tid].as_json()
+        return json_response(turnouts[tid].as_json_bytes())
     return None, 404
 
 
@@ -275,7 +264,7 @@ async def patch_turnout(request: Request, tid: str):  # noqa: ANN201
         turnout = turnouts[tid]
         if turnout.validate_update(request.json):
             turnout.set_turnout(request.json)
-            return turnout.as_json()
+            return json_response(turnout.as_json_bytes())
         return None, 400
     return None, 404
 
@@ -285,7 +274,9 @@ async def delete_turnout(request: Request, tid: str):  # noqa: ANN201
     """Delete the turnout."""
     if tid in turnouts:
         turnouts[tid].set_turnout({"state": "off"})
+        unregister(turnouts[tid].index)
         del turnouts[tid]
+        changed()
         return None, 200
     return None, 404
 
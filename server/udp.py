@@ -0,0 +1,143 @@
+"""Compact binary command protocol over UDP.
+
+Every signal and turnout has a numeric index, which is used to address it in the binary protocol. A command is a
+5 byte frame, consisting of a 16 bit sequence number, the 16 bit device index, and the 8 bit state code, all
+big-endian. The state code is the position of the state in the device's ``states``.
+
+Each command is answered with a 6 byte acknowledgement frame, consisting of the sequence number, the device index,
+the 8 bit status code, and the device's current state code. If a client repeats the sequence number of its last
+command, the acknowledgement is sent again without applying the command a second time.
+"""
+import socket
+import struct
+import uasyncio as asyncio
+
+from microdot import print_exception
+
+
+#: The command was applied
+STATUS_OK = 0
+#: No device has the given index
+STATUS_UNKNOWN_DEVICE = 1
+#: The state code is not valid for the device
+STATUS_INVALID_STATE = 2
+
+#: The number of clients for which the last acknowledgement is remembered
+max_clients = 8
+
+#: The devices by index, each stored as a ``(device, setter)`` tuple
+devices = {}
+
+_acks = {}
+_socket = None
+_task = None
+
+
+def index_available(index) -> bool:  # noqa: ANN001
+    """Check whether the index is a valid, unused device index."""
+    return isinstance(index, int) and 0 <= index <= 0xFFFF and index not in devices
+
+
+def register(device, index: int | None, setter) -> int:  # noqa: ANN001
+    """Register the device and return its index.
+
+    If no index is given, the lowest unused index is assigned. The setter is called with the update body to change
+    the device's state.
+    """
+    if index is None:
+        index = 0
+        while index in devices:
+            index = index + 1
+    devices[index] = (device, setter)
+    return index
+
+
+def unregister(index: int) -> None:
+    """Remove the device with the given index."""
+    if index in devices:
+        del devices[index]
+
+
+def handle(frame: bytes, addr) -> bytes | None:  # noqa: ANN001
+    """Apply a command frame and return the acknowledgement frame.
+
+    Frames that are not 5 bytes long are ignored.
+    """
+    if len(frame) != 5:
+        return None
+    seq, index, code = struct.unpack("!HHB", frame)
+    last = _acks.get(addr)
+    if last is not None and last[0] == seq:
+        return last[1]
+    current = 0
+    if index not in devices:
+        status = STATUS_UNKNOWN_DEVICE
+    else:
+        device, setter = devices[index]
+        if code < len(device.states):
+            setter({"state": device.states[code]})
+            status = STATUS_OK
+        else:
+            status = STATUS_INVALID_STATE
+        if device.state in device.states:
+            current = device.states.index(device.state)
+    ack = struct.pack("!HHBB", seq, index, status, current)
+    if last is None and len(_acks) >= max_clients:
+        del _acks[next(iter(_acks))]
+    _acks[addr] = (seq, ack)
+    return ack
+
+
+if hasattr(asyncio, "core"):
+
+    def _readable(sock):  # noqa: ANN001, ANN202
+        """Wait until a datagram can be received from the socket.
+
+        The socket is registered with the uasyncio I/O queue, so that the task is only woken up when data arrives.
+        This is a generator instead of a coroutine, as uasyncio is entered by yielding the queue.
+        """
+        yield asyncio.core._io_queue.queue_read(sock)
+
+    async def _recvfrom(sock, size: int) -> tuple:  # noqa: ANN001
+        """Wait for and receive a datagram of up to `size` bytes, returning it with the sender's address."""
+        await _readable(sock)
+        return sock.recvfrom(size)
+
+else:
+    # CPython's asyncio, used when the server is run on the host by the benchmark
+
+    async def _recvfrom(sock, size: int) -> tuple:  # noqa: ANN001
+        """Wait for and receive a datagram of up to `size` bytes, returning it with the sender's address."""
+        return await asyncio.get_running_loop().sock_recvfrom(sock, size)
+
+
+async def serve(port: int) -> None:
+    """Receive and acknowledge commands on the given port until :func:`shutdown` is called."""
+    global _socket, _task
+    _socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    _socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    _socket.bind(socket.getaddrinfo("0.0.0.0", port)[0][-1])
+    _socket.setblocking(False)
+    _task = asyncio.current_task()
+    while _socket is not None:
+        try:
+            frame, addr = await _recvfrom(_socket, 16)
+        except OSError:
+            continue
+        try:
+            ack = handle(frame, addr)
+            if ack is not None:
+                _socket.sendto(ack, addr)
+        except Exception as e:
+            print_exception(e)
+
+
+def shutdown() -> None:
+    """Stop receiving commands."""
+    global _socket, _task
+    if _task is not None:
+        _task.cancel()
+        _task = None
+    if _socket is not None:
+        _socket.close()
+        _socket = None
@@ -0,0 +1,28 @@
+"""Event loop stall detection.
+
+The watchdog task sleeps for a fixed interval and measures how much later than expected it wakes up. A lag above the
+threshold means that a handler or task blocked the event loop, for example by calling a blocking ``sleep``. Each stall
+is logged with the requests that were being handled at the time and counted in the metrics.
+"""
+import uasyncio as asyncio
+
+from time import ticks_diff, ticks_ms
+
+from .metrics import record_lag
+
+
+#: Time in milliseconds between the watchdog's ticks
+interval = 100
+#: Lag in milliseconds above which the event loop counts as stalled
+threshold = 100
+
+
+async def watch() -> None:
+    """Measure the event loop lag at every tick."""
+    while True:
+        start = ticks_ms()
+        await asyncio.sleep_ms(interval)
+        lag = ticks_diff(ticks_ms(), start) - interval
+        culprits = record_lag(lag, threshold)
+        if culprits is not None:
+            print(f"Event loop stalled for {lag} ms while handling {culprits}")
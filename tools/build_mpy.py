@@ -0,0 +1,74 @@
+"""Compile the application modules to .mpy files.
+
+Usage: ``python tools/build_mpy.py [--output DIR] [--bundle FILE] [--mpy-cross PATH] [--march ARCH]``, run from the
+repository root.
+
+The modules are compiled with ``mpy-cross``, which must produce the .mpy version of the firmware, so install the
+release that matches it (``pip install mpy-cross==<firmware version>``). ``main.py``, the modules it uses to fall
+back from incompatible .mpy files, and the OpenAPI schema document are copied unchanged. The output directory then
+contains the complete application and, if ``--bundle`` is given, the same files are written to a bundle for
+``POST /api/system/bundle``.
+"""
+import argparse
+import glob
+import os
+import shutil
+import subprocess
+import sys
+
+from bundle import build
+
+
+#: The modules that are compiled
+MODULES = [
+    "microdot.py",
+    "microdot_asyncio.py",
+    "microdot_cors.py",
+    "uuid.py",
+    "server/*.py",
+    "server/devices/*.py",
+    "utoolkit/*.py",
+]
+#: The files that are always deployed unchanged
+SOURCES = ["main.py", "server/openapi.json", "utoolkit/__init__.py", "utoolkit/files.py", "utoolkit/mpy.py"]
+
+
+def main() -> None:
+    """Parse the command-line arguments and compile the modules."""
+    parser = argparse.ArgumentParser(description="Compile the application modules to .mpy files.")
+    parser.add_argument("--output", default="build", help="the output directory (default: build)")
+    parser.add_argument("--bundle", help="also write the files to this bundle")
+    parser.add_argument("--mpy-cross", default="mpy-cross", help="the mpy-cross executable (default: mpy-cross)")
+    parser.add_argument("--march", help="the architecture to compile native code for, for example armv6m")
+    args = parser.parse_args()
+
+    shutil.rmtree(args.output, ignore_errors=True)
+    names = []
+    for pattern in MODULES:
+        for source in sorted(glob.glob(pattern)):
+            source = source.replace("\\", "/")
+            if source in SOURCES:
+                continue
+            name = f"{source[:-3]}.mpy"
+            os.makedirs(os.path.join(args.output, os.path.dirname(name)), exist_ok=True)
+            command = [args.mpy_cross, "-o", os.path.join(args.output, name), "-s", source, source]
+            if args.march:
+                command.append(f"-march={args.march}")
+            result = subprocess.run(command)
+            if result.returncode != 0:
+                sys.exit(result.returncode)
+            names.append(name)
+    for source in SOURCES:
+        os.makedirs(os.path.join(args.output, os.path.dirname(source)), exist_ok=True)
+        shutil.copy(source, os.path.join(args.output, source))
+        names.append(source)
+    print(f"Built {len(names)} files in {args.output}")
+
+    if args.bundle:
+        with open(args.bundle, "wb") as out_f:
+            out_f.write(build(names, args.output))
+        print(f"Wrote bundle {args.bundle}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""Build a bundle for the ``POST /api/system/bundle`` endpoint.
+
+Usage: ``python tools/bundle.py OUTPUT FILE...``, run from the repository root. The files are stored under the given
+relative paths.
+"""
+import hashlib
+import json
+import os
+import struct
+import sys
+
+
+def build(filenames: list, root: str = ".") -> bytes:
+    """Return the bundle containing the files, which are given relative to the `root` directory."""
+    contents = {}
+    for filename in filenames:
+        with open(os.path.join(root, filename), "rb") as in_f:
+            contents[filename.replace("\\", "/")] = in_f.read()
+    manifest = json.dumps({name: hashlib.sha256(data).hexdigest() for name, data in contents.items()}).encode()
+    parts = [struct.pack("!I", len(manifest)), manifest]
+    for name, data in contents.items():
+        encoded = name.encode()
+        parts.append(struct.pack("!H", len(encoded)) + encoded + struct.pack("!I", len(data)))
+        parts.append(data)
+    return b"".join(parts)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print(__doc__.strip())
+        sys.exit(1)
+    with open(sys.argv[1], "wb") as out_f:
+        out_f.write(build(sys.argv[2:]))
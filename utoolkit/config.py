@@ -2,6 +2,9 @@
 
 To access the settings, import the "settings" object. This is a nested set of `dict` objects that are automatically
 loaded from a ".env" file, if one exists in the current working directory.
+
+The values are stored as the strings given in the file. :meth:`PersistentConfiguration.typed` returns them converted
+to `int` or `bool` if they are written as integers or as "true" / "false".
 """
 
 
@@ -12,11 +15,16 @@ class DottedDictException(Exception):
 
 
 class DottedDict:
-    """A dict-like object that allows access via dotted strings."""
+    """A dict-like object that allows access via dotted strings.
+
+    Next to the nested view, every dotted key and each of its prefixes is stored in a flat index, so that looking up
+    a key does not need to split it.
+    """
 
     def __init__(self: 'DottedDict') -> None:
         """Initialise an empty DottedDict."""
         self._data = {}
+        self._index = {}
 
     def __setitem__(self: 'DottedDict', key: str, value) -> None:  # noqa: ANN001
         """Set a value."""
@@ -38,9 +46,22 @@ class DottedDict:
                 self._data[head][tail] = value
             else:
                 self._data[head] = value
+        self._index[key] = value
+        if tail is not None:
+            child = self._data[head]
+            self._index[head] = child
+            end = tail.find('.')
+            while end >= 0:
+                self._index[f'{head}.{tail[:end]}'] = child._index[tail[:end]]
+                end = tail.find('.', end + 1)
 
     def __getitem__(self: 'DottedDict', key: str):  # noqa: ANN204
         """Get a value via a key."""
+        try:
+            return self._index[key]
+        except KeyError:
+            pass
+        # Raise the same errors as a lookup through the nested view
         head, tail = self.__splitkey__(key)
         value = self._data[head]
         if tail is None:
@@ -52,13 +73,11 @@ class DottedDict:
 
     def __contains__(self: 'DottedDict', key: str) -> bool:
         """Check whether a key exists."""
-        head, tail = self.__splitkey__(key)
-        if head in self._data:
-            if tail is None:
-                return True
-            if isinstance(self._data[head], DottedDict):
-                return tail in self[head]
-        return False
+        return key in self._index
+
+    def get(self: 'DottedDict', key: str, default=None):  # noqa: ANN001, ANN201
+        """Get a value via a key, returning the `default` if the key does not exist."""
+        return self._index.get(key, default)
 
     def __splitkey__(self: 'DottedDict', key: str):  # noqa: ANN204
         """Split the key into head and tail."""
@@ -72,24 +91,51 @@ class DottedDict:
         return f'DottedDict({self._data})'
 
 
+def parse_value(value: str):  # noqa: ANN201
+    """Convert the value to an `int` or `bool` if it is written as one and remove any enclosing quotes otherwise."""
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'':
+        return value[1:-1]
+    if value == 'true':
+        return True
+    if value == 'false':
+        return False
+    digits = value[1:] if value.startswith('-') else value
+    if digits.isdigit() and (digits == '0' or digits[0] != '0'):
+        return int(value)
+    return value
+
+
 class PersistentConfiguration(DottedDict):
-    """Access settings defined in a .env file."""
+    """Access settings defined in a .env file.
+
+    Next to the string values, the converted values are stored in a second flat index for :meth:`typed`.
+    """
 
     def __init__(self: 'PersistentConfiguration') -> None:
         """Create a Settings object, loading settings from the .env file."""
         super().__init__()
+        self._typed = {}
         try:
             with open('.env') as in_f:
-                for line in in_f.readlines():
+                for line in in_f:
                     line = line.strip()
                     if line.startswith('#'):
                         continue
-                    if '=' in line:
-                        key = line[0:line.find('=')]
-                        value = line[line.find('=') + 1:]
+                    idx = line.find('=')
+                    if idx >= 0:
+                        key = line[0:idx]
+                        value = line[idx + 1:]
                         self[key] = value
+                        self._typed[key] = parse_value(value)
         except OSError as e:
             print(e)
 
+    def typed(self: 'PersistentConfiguration', key: str, default=None):  # noqa: ANN001, ANN201
+        """Get the value via a key, converted to an `int` or `bool` if it is written as one.
+
+        Returns the `default` if the key does not exist.
+        """
+        return self._typed.get(key, default)
+
 
 settings = PersistentConfiguration()
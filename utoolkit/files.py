@@ -0,0 +1,103 @@
+"""File handling utilities."""
+import json
+import os
+
+
+def atomic_write(filename: str, data) -> None:  # noqa: ANN001
+    """Write the `data` to the file `filename`.
+
+    The `data` is either bytes or an iterable of bytes chunks, which are written one at a time so that the whole
+    content never has to be held in memory. It is first written to a temporary file, which then replaces `filename`,
+    so that `filename` always contains either the old or the new data in full.
+    """
+    tmp_filename = f'{filename}.tmp'
+    with open(tmp_filename, 'wb') as out_f:
+        if isinstance(data, bytes):
+            out_f.write(data)
+        else:
+            for chunk in data:
+                out_f.write(chunk)
+    os.rename(tmp_filename, filename)
+
+
+def remove(filename: str) -> None:
+    """Remove the file `filename`, ignoring files that do not exist."""
+    try:
+        os.remove(filename)
+    except OSError:
+        pass
+
+
+def hash_file(filename: str, hasher, buffer: memoryview) -> int:  # noqa: ANN001
+    """Update the `hasher` with the contents of the file `filename` and return the file's size.
+
+    The file is read into the preallocated `buffer`, so that no memory is allocated per chunk.
+    """
+    size = 0
+    with open(filename, 'rb') as in_f:
+        while True:
+            length = in_f.readinto(buffer)
+            if not length:
+                break
+            hasher.update(buffer if length == len(buffer) else buffer[:length])
+            size = size + length
+    return size
+
+
+def makedirs(path: str) -> None:
+    """Create the directory `path` and any of its parents that do not exist."""
+    current = ''
+    for part in path.split('/'):
+        current = f'{current}/{part}' if current else part
+        try:
+            os.mkdir(current)
+        except OSError:
+            pass
+
+
+def remove_tree(path: str) -> None:
+    """Remove the file or directory `path` with all its contents, ignoring paths that do not exist."""
+    try:
+        mode = os.stat(path)[0]
+    except OSError:
+        return
+    if mode & 0x4000:
+        for name in os.listdir(path):
+            remove_tree(f'{path}/{name}')
+        os.rmdir(path)
+    else:
+        os.remove(path)
+
+
+def apply_journal(journal: str, installed=None) -> None:  # noqa: ANN001
+    """Move the files listed in the `journal` from their staging directory into place.
+
+    The journal is a JSON object with the "staging" directory and the list of "files" to move. Files that are no
+    longer in the staging directory have already been moved, so that applying the journal again after an interruption
+    completes the move. If given, `installed` is called with each filename once all files are in place. Afterwards
+    the journal and the staging directory are removed.
+    """
+    try:
+        with open(journal) as in_f:
+            data = json.load(in_f)
+    except OSError:
+        return
+    except ValueError as e:
+        print(e)
+        remove(journal)
+        return
+    staging = data['staging']
+    for name in data['files']:
+        staged = f'{staging}/{name}'
+        try:
+            os.stat(staged)
+        except OSError:
+            continue
+        if '/' in name:
+            makedirs(name[:name.rfind('/')])
+        os.rename(staged, name)
+    if installed is not None:
+        for name in data['files']:
+            installed(name)
+    os.remove(journal)
+    remove_tree(staging)
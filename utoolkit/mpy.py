@@ -0,0 +1,98 @@
+"""Precompiled .mpy module handling.
+
+MicroPython imports a module from its .py file if one exists and only otherwise from its .mpy file. When a .mpy file
+is installed, the module's .py file is therefore moved aside to a .py.fallback file. If the .mpy file turns out not to
+be compatible with the firmware, for example after a firmware update, the .py file is restored from the fallback.
+
+The firmware only runs boot.py and main.py at start-up, so these cannot be replaced by .mpy files.
+"""
+import os
+import sys
+
+from utoolkit.files import remove
+
+
+def firmware_mpy() -> int | None:
+    """Return the .mpy version and architecture supported by the firmware, or None if unknown."""
+    return getattr(sys.implementation, '_mpy', None)
+
+
+def compatible(header: bytes) -> bool:
+    """Check whether the header of a .mpy file matches the bytecode version and architecture of the firmware.
+
+    Files without native code can be loaded on any architecture.
+    """
+    mpy = firmware_mpy()
+    if mpy is None or len(header) < 4 or header[0] != 0x4D:
+        return False
+    if header[1] != mpy & 0xFF or header[2] & 0x03 != (mpy >> 8) & 0x03:
+        return False
+    arch = header[2] >> 2
+    return arch == 0 or arch == mpy >> 10
+
+
+def startup_script(filename: str) -> bool:
+    """Check whether the .mpy file `filename` would replace boot.py or main.py."""
+    return filename.lstrip('/') in ('boot.mpy', 'main.mpy')
+
+
+def file_compatible(filename: str) -> bool:
+    """Check whether the .mpy file `filename` is compatible with the firmware."""
+    try:
+        with open(filename, 'rb') as in_f:
+            header = in_f.read(4)
+    except OSError:
+        return False
+    return compatible(header)
+
+
+def installed(filename: str) -> None:
+    """Update the module's other files after `filename` has been installed.
+
+    Installing a .mpy file moves the module's .py file aside as its fallback. Installing a .py file removes the
+    module's .mpy file and fallback, as the source is newer.
+    """
+    if filename.endswith('.mpy'):
+        source = f'{filename[:-4]}.py'
+        try:
+            os.stat(source)
+        except OSError:
+            return
+        remove(f'{source}.fallback')
+        os.rename(source, f'{source}.fallback')
+    elif filename.endswith('.py'):
+        remove(f'{filename[:-3]}.mpy')
+        remove(f'{filename}.fallback')
+
+
+def revert(filename: str) -> bool:
+    """Remove the .mpy file `filename` and restore the module's .py file, returning whether a fallback existed."""
+    remove(filename)
+    source = f'{filename[:-4]}.py'
+    try:
+        os.rename(f'{source}.fallback', source)
+        return True
+    except OSError:
+        return False
+
+
+def modules(path: str = '') -> list:
+    """Return the filenames of all .mpy files below the directory `path`."""
+    result = []
+    for name in os.listdir(path or '.'):
+        filename = f'{path}/{name}' if path else name
+        if os.stat(filename)[0] & 0x4000:
+            result.extend(modules(filename))
+        elif name.endswith('.mpy'):
+            result.append(filename)
+    return result
+
+
+def check_installed() -> None:
+    """Revert all .mpy files that are not compatible with the firmware to their .py fallback."""
+    if firmware_mpy() is None:
+        return
+    for filename in modules():
+        if not file_compatible(filename):
+            print(f'{filename} is not compatible with the firmware')
+            revert(filename)